@@ -0,0 +1,169 @@
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any
+from agent.core.state import make_initial_state
+from agent.core.checkpoint import new_run_id, run_config
+from agent.utils.logger import logger
+from agent.utils.tracing import tracer
+
+# Compiled graph of a process-pool worker, built once by _init_worker
+_worker_app = None
+
+
+def load_tasks(path: str) -> List[Dict[str, Any]]:
+    """Read a JSONL file into [{"id": ..., "task": ...}]"""
+    tasks = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            task = record.get("task") or record.get("input") or record.get("objective")
+            if not task:
+                # Backlog-style records: {"request_id", "title", "body"}
+                task = "\n\n".join(str(record[k]) for k in ("title", "body") if record.get(k))
+            task_id = record.get("id") or record.get("request_id") or str(line_no)
+            tasks.append({"id": task_id, "task": task})
+    return tasks
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run_task(app, task: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one task through the graph, timing every node"""
+    state = make_initial_state(task["task"])
+    # Each attempt is its own checkpoint thread, so reruns of a batch start fresh
+    run_id = f"{task['id']}-{new_run_id()}"
+    node_timings: List[List[Any]] = []
+    start = time.perf_counter()
+    last = start
+    error = None
+
+    with tracer.span("run", kind="run", task_id=task["id"], run_id=run_id) as span:
+        try:
+            # Node updates arrive as each node finishes, so the gap since the previous
+            # update is that node's wall time. The state itself comes from "values",
+            # which has the reducers (e.g. past_steps' operator.add) applied
+            for mode, chunk in app.stream(state, run_config(run_id), stream_mode=["updates", "values"]):
+                if mode == "values":
+                    state = chunk
+                    continue
+                now = time.perf_counter()
+                for node in chunk:
+                    node_timings.append([node, now - last])
+                last = now
+        except Exception as e:
+            logger.error(f"Task {task['id']} failed: {e}")
+            error = str(e)
+            span.status = "error"
+            span.set(error=error)
+
+    return {
+        "id": task["id"],
+        "run_id": run_id,
+        "task": task["task"],
+        "response": state.get("response"),
+        "error": error,
+        "latency": time.perf_counter() - start,
+        "node_timings": node_timings
+    }
+
+
+def _init_worker():
+    global _worker_app
+    from agent.core.graph import build_graph
+    # Workers export their own spans (profiling summaries stay per process)
+    tracer.configure()
+    _worker_app = build_graph()
+
+
+def _run_in_worker(task: Dict[str, Any]) -> Dict[str, Any]:
+    return run_task(_worker_app, task)
+
+
+class BatchRunner:
+    """
+    Runs many tasks against one compiled graph.
+    Threads share the graph (and its LLM client, memory store and tools) built once
+    by the caller; processes build one graph per worker at pool start-up.
+    """
+    def __init__(self, app=None, workers: int = 4, executor: str = "thread"):
+        self.app = app
+        self.workers = workers
+        self.executor = executor
+
+    def run(self, tasks: List[Dict[str, Any]], output_path: str) -> Dict[str, Any]:
+        results = []
+        start = time.perf_counter()
+
+        if self.executor == "process":
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            submit = lambda task: pool.submit(_run_in_worker, task)
+        else:
+            if self.app is None:
+                from agent.core.graph import build_graph
+                self.app = build_graph()
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+            submit = lambda task: pool.submit(run_task, self.app, task)
+
+        with pool, open(output_path, 'w', encoding='utf-8') as out:
+            futures = [submit(task) for task in tasks]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                # Written as soon as each task finishes so partial runs keep their output
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                logger.info(f"[{len(results)}/{len(tasks)}] {result['id']} finished in {result['latency']:.2f}s")
+
+        elapsed = time.perf_counter() - start
+        return self.summarize(results, elapsed)
+
+    @staticmethod
+    def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+        latencies = [r["latency"] for r in results]
+        per_node: Dict[str, List[float]] = {}
+        for r in results:
+            for node, duration in r["node_timings"]:
+                per_node.setdefault(node, []).append(duration)
+
+        return {
+            "tasks": len(results),
+            "failed": sum(1 for r in results if r["error"]),
+            "elapsed": elapsed,
+            "tasks_per_sec": len(results) / elapsed if elapsed > 0 else 0.0,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "nodes": {
+                node: {
+                    "calls": len(durations),
+                    "total": sum(durations),
+                    "mean": sum(durations) / len(durations),
+                    "p95": percentile(durations, 95)
+                }
+                for node, durations in per_node.items()
+            }
+        }
+
+
+def format_report(stats: Dict[str, Any]) -> str:
+    lines = [
+        f"Tasks: {stats['tasks']} ({stats['failed']} failed) in {stats['elapsed']:.2f}s",
+        f"Throughput: {stats['tasks_per_sec']:.2f} tasks/sec",
+        f"Latency: p50 {stats['latency_p50']:.2f}s, p95 {stats['latency_p95']:.2f}s",
+        "",
+        f"{'node':<12}{'calls':>8}{'total(s)':>12}{'mean(s)':>10}{'p95(s)':>10}"
+    ]
+    for node, n in sorted(stats["nodes"].items(), key=lambda item: -item[1]["total"]):
+        lines.append(f"{node:<12}{n['calls']:>8}{n['total']:>12.2f}{n['mean']:>10.3f}{n['p95']:>10.3f}")
+    return "\n".join(lines)
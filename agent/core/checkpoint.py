@@ -0,0 +1,66 @@
+import os
+import uuid
+from typing import Any, Dict, Optional
+from agent.utils.config import config
+from agent.utils.logger import logger
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def run_config(run_id: str) -> Dict[str, Any]:
+    """Graph config for one run; the run id is the checkpoint thread"""
+    return {"configurable": {"thread_id": run_id}}
+
+
+def create_checkpointer(backend: Optional[str] = None):
+    """
+    Checkpoint saver selected by checkpoint.backend:
+      "sqlite" - durable, one row per node step in checkpoint.path (needs langgraph-checkpoint-sqlite)
+      "memory" - in-process only, lost on exit
+      "none"   - no checkpoints
+    """
+    backend = backend or config.get("checkpoint.backend", "sqlite")
+    if backend == "none":
+        return None
+    if backend == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    if backend == "sqlite":
+        try:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+        except ImportError:
+            logger.warning("langgraph-checkpoint-sqlite is not installed; runs will not be resumable")
+            return None
+        import sqlite3
+        path = config.get("checkpoint.path", "agent_memory_db/checkpoints.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Shared by batch worker threads; SqliteSaver serializes access itself
+        conn = sqlite3.connect(path, check_same_thread=False)
+        saver = SqliteSaver(conn)
+        prune_runs(saver, config.get("checkpoint.max_runs", 100))
+        return saver
+    raise ValueError(f"Unknown checkpoint backend: {backend}")
+
+
+def prune_runs(saver, keep: int) -> int:
+    """
+    Delete all but the keep most recent runs from a SqliteSaver; the file otherwise
+    grows by every node step of every run. Checkpoint ids are time-ordered (uuid6),
+    so a thread's newest id dates its last step. keep <= 0 keeps everything.
+    """
+    if not keep or keep <= 0:
+        return 0
+    saver.setup()
+    with saver.lock, saver.conn:
+        stale = [row[0] for row in saver.conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id) DESC LIMIT -1 OFFSET ?",
+            (keep,)
+        )]
+        for thread_id in stale:
+            saver.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            saver.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+    if stale:
+        logger.info(f"Pruned {len(stale)} old runs from the checkpoint store")
+    return len(stale)
@@ -1,27 +1,58 @@
-from langgraph.graph import StateGraph, END
+import functools
 from agent.core.state import AgentState
-from agent.core.nodes import AgentNodes
-from agent.llm.client import LLMClient
-from agent.tools.manager import ToolManager
-from agent.memory.manager import MemoryManager
+from agent.utils.config import config
+from agent.utils.tracing import tracer
+
+def traced_node(name: str, fn):
+    """Wrap a node function so each invocation is recorded as a node span"""
+    @functools.wraps(fn)
+    def node(state: AgentState):
+        with tracer.span(name, kind="node"):
+            return fn(state)
+    return node
+
+def build_graph(scheduler: str = None, stream: bool = False, memory: bool = None, checkpointer=None):
+    # Heavy dependencies (langgraph, openai, chromadb, sentence-transformers) are
+    # imported here rather than at module level, so importing the CLI stays cheap
+    from langgraph.graph import StateGraph, END
+    from agent.core.nodes import AgentNodes
+    from agent.llm.client import LLMClient
+    from agent.llm.cache import ResponseCache
+    from agent.tools.manager import ToolManager
+
+    # "sequential" runs one plan step per cycle, "parallel" runs all ready steps of the plan DAG at once
+    scheduler = scheduler or config.get("agent.scheduler", "sequential")
+    # Without long-term memory, chromadb and the embedding model are never loaded
+    memory = config.get("memory.enabled", True) if memory is None else memory
 
-def build_graph():
     # Initialize dependencies
-    llm_client = LLMClient()
+    memory_manager = None
+    if memory:
+        from agent.memory.manager import MemoryManager
+        memory_manager = MemoryManager()
+    # The response cache reuses the memory embeddings for near-duplicate prompt matching
+    embedding_fn = memory_manager.embedding_fn if memory_manager else None
+    llm_client = LLMClient(cache=ResponseCache.from_config(embedding_fn=embedding_fn))
     # Note: ToolManager might need updates to handle LangChain tools internally, 
     # but for now we pass it as is.
-    tool_manager = ToolManager() 
-    memory_manager = MemoryManager()
+    # With the memory manager, tools are retrieved per step instead of taking the first N
+    tool_manager = ToolManager(memory_manager=memory_manager)
     
-    nodes = AgentNodes(llm_client, tool_manager, memory_manager)
+    nodes = AgentNodes(llm_client, tool_manager, memory_manager, stream=stream)
     
     # Initialize Graph
     workflow = StateGraph(AgentState)
     
     # Add Nodes
-    workflow.add_node("plan", nodes.plan_node)
-    workflow.add_node("execute", nodes.execute_node)
-    workflow.add_node("reflect", nodes.reflect_node)
+    workflow.add_node("plan", traced_node("plan", nodes.plan_node))
+    if scheduler == "parallel":
+        workflow.add_node("execute", traced_node("execute", nodes.execute_parallel_node))
+        workflow.add_node("reflect", traced_node("reflect", nodes.reflect_parallel_node))
+    else:
+        workflow.add_node("execute", traced_node("execute", nodes.execute_node))
+        workflow.add_node("reflect", traced_node("reflect", nodes.reflect_node))
+    # Compresses older steps into the running summary before the next execute
+    workflow.add_node("summarize", traced_node("summarize", nodes.summarize_node))
     
     # Set Entry Point
     workflow.set_entry_point("plan")
@@ -29,6 +60,7 @@ def build_graph():
     # Add Edges
     workflow.add_edge("plan", "execute")
     workflow.add_edge("execute", "reflect")
+    workflow.add_edge("summarize", "execute")
     
     # Conditional Edge from Reflect
     def should_continue(state: AgentState):
@@ -53,11 +85,19 @@ def build_graph():
         "reflect",
         should_continue,
         {
-            "continue": "execute",
+            "continue": "summarize",
             "end": END
         }
     )
     
-    # Compile
-    app = workflow.compile()
+    # Compile. With a checkpointer every node's state update is saved under the run's
+    # thread_id, so an interrupted run resumes after its last completed node
+    # (checkpoint.backend in the config; pass checkpointer=False to disable).
+    # Without long-term memory nothing is written under agent_memory_db, checkpoints included
+    if checkpointer is None:
+        from agent.core.checkpoint import create_checkpointer
+        checkpointer = create_checkpointer(None if memory else "none")
+    elif checkpointer is False:
+        checkpointer = None
+    app = workflow.compile(checkpointer=checkpointer)
     return app
@@ -1,17 +1,75 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, TYPE_CHECKING
 from agent.core.state import AgentState
-from agent.llm.client import LLMClient
-from agent.tools.manager import ToolManager
-from agent.memory.manager import MemoryManager
-from langchain_core.messages import HumanMessage, SystemMessage
-import json
+from agent.utils.config import config
+from agent.utils.tokens import count_tokens
+from agent.utils.prompt_budget import PromptSection, build_prompt, compact_json
+from agent.llm.router import LLMUnavailableError
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import re
 
+if TYPE_CHECKING:
+    from agent.llm.client import LLMClient
+    from agent.tools.manager import ToolManager
+    from agent.memory.manager import MemoryManager
+
+# Executions of one step after which reflect stops retrying it
+MAX_STEP_EXECUTIONS = 3
+
+# Plan lines may end with "[after: 1, 3]" or "[after: none]" (1-based step numbers)
+DEPENDENCY_PATTERN = re.compile(r'\[\s*(?:after|depends on)\s*:\s*([^\]]*)\]', re.IGNORECASE)
+
+
+def parse_plan(response: str):
+    """Parse a numbered plan into step texts and 0-based dependency lists"""
+    plan = []
+    dependencies = []
+    for line in response.split('\n'):
+        line = line.strip()
+        # Support *, -, 1. etc
+        if line and (line[0].isdigit() or line.startswith('-') or line.startswith('*')):
+            match = DEPENDENCY_PATTERN.search(line)
+            if match:
+                line = DEPENDENCY_PATTERN.sub('', line)
+            # Remove numbering and bullets
+            cleaned_line = re.sub(r'^[\d\.\-\*\s]+', '', line).strip()
+            if not cleaned_line:
+                continue
+            index = len(plan)
+            if match:
+                # Only earlier steps are valid dependencies, which keeps the plan acyclic
+                deps = sorted({int(n) - 1 for n in re.findall(r'\d+', match.group(1)) if 0 < int(n) <= index})
+            else:
+                # Unannotated steps are assumed to depend on the previous one
+                deps = [index - 1] if index > 0 else []
+            plan.append(cleaned_line)
+            dependencies.append(deps)
+    return plan, dependencies
+
+
+def sequential_dependencies(plan: List[str]) -> List[List[int]]:
+    return [[i - 1] if i > 0 else [] for i in range(len(plan))]
+
+
+def is_error_result(result: str) -> bool:
+    return "Error" in result or "Failed" in result
+
 class AgentNodes:
-    def __init__(self, llm_client: LLMClient, tool_manager: ToolManager, memory_manager: MemoryManager):
+    def __init__(self, llm_client: "LLMClient", tool_manager: "ToolManager", memory_manager: Optional["MemoryManager"], stream: bool = False):
         self.llm = llm_client
         self.tools = tool_manager
         self.memory = memory_manager
+        # When set, LLM token deltas are emitted as LangGraph "custom" stream events
+        self.stream = stream
+
+    def _token_writer(self, node: str, **extra) -> Optional[Callable[[str], None]]:
+        """Forward LLM deltas to app.stream(stream_mode="custom") consumers"""
+        if not self.stream:
+            return None
+        from langgraph.config import get_stream_writer
+        # Resolved here, on the node's own thread, since worker threads do not inherit the run context
+        writer = get_stream_writer()
+        return lambda delta: writer({"node": node, "delta": delta, **extra})
 
     def plan_node(self, state: AgentState) -> Dict[str, Any]:
         """Generate a plan based on input"""
@@ -25,67 +83,82 @@ class AgentNodes:
         # Simple tool names list for planning context
         tool_names = [t['name'] for t in self.tools.list_tools(limit=10)] # Retrieve some tools context
         
-        prompt = template.format(objective=objective, tool_names=tool_names)
+        llm = self.llm.for_node("plan")
+        prompt = build_prompt("plan", template, {"objective": objective, "tool_names": tool_names},
+                              model=llm.llm_model_name)
         
-        response = self.llm.generate(prompt, system_prompt="You are a helpful AI assistant that plans tasks.")
+        response = llm.generate(
+            prompt,
+            system_prompt="You are a helpful AI assistant that plans tasks.",
+            on_token=self._token_writer("plan")
+        )
         
-        # Parse the response into a list of strings
-        plan = []
-        for line in response.split('\n'):
-            line = line.strip()
-            # Support *, -, 1. etc
-            if line and (line[0].isdigit() or line.startswith('-') or line.startswith('*')):
-                # Remove numbering and bullets
-                cleaned_line = re.sub(r'^[\d\.\-\*\s]+', '', line).strip()
-                if cleaned_line:
-                    plan.append(cleaned_line)
+        # Parse the response into a list of strings plus step dependencies
+        plan, dependencies = parse_plan(response)
         
         if not plan:
             # Fallback if parsing fails or LLM returns non-list
             plan = [response]
+            dependencies = [[]]
             
         print(f"Generated Plan: {plan}")
             
         return {
             "plan": plan, 
+            "step_dependencies": dependencies,
+            "completed_steps": [],
             "current_step_index": 0, 
             "past_steps": [],
             "response": None
         }
 
-    def _summarize_memory(self, state: AgentState) -> Dict[str, Any]:
-        """Compress memory if history is too long"""
+    @staticmethod
+    def _format_steps(steps: List[Dict[str, Any]]) -> str:
+        return "\n".join([f"Step: {s['step']}\nResult: {s['result']}" for s in steps])
+
+    def summarize_node(self, state: AgentState) -> Dict[str, Any]:
+        """
+        Rolling history compression, run before every execute after the first.
+        past_steps is append-only, so summarized_upto marks how much of it the summary
+        already covers. Once the steps after that mark exceed the token budget, all but
+        the most recent keep_recent of them are folded into the existing summary.
+        """
         history = state.get("past_steps", [])
-        if len(history) > 5: # Threshold for demo, usually 10+
-            from agent.utils.prompt_loader import prompt_loader
-            
-            history_text = "\n".join([f"Step: {s['step']}\nResult: {s['result']}" for s in history])
-            template = prompt_loader.get("summary_template")
-            prompt = template.format(history=history_text)
-            
-            summary = self.llm.generate(prompt)
-            print(f"--- Memory Compressed: {summary[:50]}... ---")
-            
-            # Return new state updates
-            return {
-                "summary": summary,
-                "past_steps": [] # Clear history after summarization
-            }
-        return {}
+        start = state.get("summarized_upto", 0)
+        keep_recent = config.get("memory.summary.keep_recent", 3)
+        max_tokens = config.get("memory.summary.max_history_tokens", 1500)
+
+        unsummarized = history[start:]
+        # The history ends up in execute prompts, so it is measured with that model's tokenizer
+        execute_model = self.llm.for_node("execute").llm_model_name
+        if len(unsummarized) <= keep_recent or count_tokens(self._format_steps(unsummarized), execute_model) <= max_tokens:
+            return {}
+
+        evicted = unsummarized[:len(unsummarized) - keep_recent]
+        from agent.utils.prompt_loader import prompt_loader
+        template = prompt_loader.get("summary_template")
+        llm = self.llm.for_node("summarize")
+        # Only the newly evicted steps are sent, never the full history
+        prompt = build_prompt("summarize", template, {"summary": state.get("summary") or "None"}, [
+            PromptSection("history", [self._format_steps([s]) for s in evicted], keep="tail",
+                          max_item_tokens=config.get("llm.prompt.max_result_tokens", 400))
+        ], model=llm.llm_model_name)
+
+        try:
+            summary = llm.generate(prompt)
+        except Exception as e:
+            # Keep the steps verbatim and try again before the next step
+            print(f"Summarization failed: {e}")
+            return {}
+        print(f"--- Memory Compressed {len(evicted)} steps: {summary[:50]}... ---")
+
+        return {
+            "summary": summary,
+            "summarized_upto": start + len(evicted)
+        }
 
     def execute_node(self, state: AgentState) -> Dict[str, Any]:
         """Execute the current step using ReAct"""
-        # Check if memory needs compression first
-        memory_update = self._summarize_memory(state)
-        if memory_update:
-             # If we compressed memory, we should conceptually update the state before proceeding.
-             # In LangGraph, we return dicts to update state. 
-             # But here we are inside a node. We can just use the updated values locally or return them.
-             # Ideally, summarization should be a separate node or a pre-hook. 
-             # For simplicity, we just use the summary in our prompt context.
-             state["summary"] = memory_update["summary"]
-             state["past_steps"] = [] # Local clear for this run
-
         print("--- Execute Node ---")
         plan = state["plan"]
         index = state["current_step_index"]
@@ -96,6 +169,52 @@ class AgentNodes:
         current_step = plan[index]
         print(f"Executing Step {index + 1}: {current_step}")
         
+        result = self._execute_step(state, current_step, on_token=self._token_writer("execute", step=index))
+
+        return {
+            "past_steps": [{"step": current_step, "result": result, "index": index}],
+            # We don't increment index here, we let the reflect node decide
+        }
+
+    def execute_parallel_node(self, state: AgentState) -> Dict[str, Any]:
+        """Execute every step whose dependencies are completed, concurrently"""
+        print("--- Execute Node (parallel) ---")
+        plan = state["plan"]
+        dependencies = state.get("step_dependencies") or sequential_dependencies(plan)
+        completed = set(state.get("completed_steps", []))
+
+        pending = [i for i in range(len(plan)) if i not in completed]
+        if not pending:
+            return {"response": "All steps completed.", "last_batch": []}
+
+        ready = [i for i in pending if all(d in completed for d in dependencies[i])]
+        if not ready:
+            # Dependencies can never be satisfied (e.g. a dropped step); fall back to plan order
+            ready = [pending[0]]
+
+        print(f"Executing Steps {[i + 1 for i in ready]} concurrently")
+
+        writers = {i: self._token_writer("execute", step=i) for i in ready}
+
+        # Each step runs in a copy of this context, so its spans nest under the node's
+        contexts = {i: contextvars.copy_context() for i in ready}
+        max_workers = min(len(ready), config.get("agent.max_parallel_steps", 4))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(
+                lambda i: contexts[i].run(self._execute_step, state, plan[i], on_token=writers[i]), ready
+            ))
+
+        # executor.map preserves input order, so past_steps stays in plan order
+        return {
+            "past_steps": [
+                {"step": plan[i], "result": result, "index": i}
+                for i, result in zip(ready, results)
+            ],
+            "last_batch": ready
+        }
+
+    def _execute_step(self, state: AgentState, current_step: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Ask the LLM how to carry out one step and run the chosen tool"""
         # Tool execution logic using LLM
         # Use retrieval to get relevant tools
         available_tools = self.tools.list_tools(query=current_step, limit=5)
@@ -103,13 +222,18 @@ class AgentNodes:
         from agent.utils.prompt_loader import prompt_loader
         template = prompt_loader.get("execute_template")
         
-        prompt = template.format(
-            current_step=current_step,
-            input=state['input'],
-            summary=state.get('summary', 'None'),
-            history=state.get('past_steps', []),
-            tools=json.dumps(available_tools, indent=2)
-        )
+        # Steps already folded into the summary are not repeated
+        history = state.get('past_steps', [])[state.get('summarized_upto', 0):]
+        max_result_tokens = config.get("llm.prompt.max_result_tokens", 400)
+        llm = self.llm.for_node("execute")
+        # Tools are ranked, so the least relevant go first; history drops its oldest steps
+        prompt = build_prompt("execute", template, {"current_step": current_step, "input": state['input']}, [
+            PromptSection("summary", [state.get('summary') or 'None'], priority=0, max_item_tokens=max_result_tokens * 2),
+            PromptSection("tools", [compact_json(t) for t in available_tools], priority=1, keep="head",
+                          max_item_tokens=config.get("llm.prompt.max_tool_tokens", 300)),
+            PromptSection("history", [self._format_steps([s]) for s in history], priority=2, keep="tail",
+                          max_item_tokens=max_result_tokens)
+        ], model=llm.llm_model_name)
         
         # Define Schema for Structured Output
         execution_schema = {
@@ -121,15 +245,24 @@ class AgentNodes:
         result = f"Failed to execute step: {current_step}"
         
         try:
-            decision = self.llm.generate_structured(
+            decision = llm.generate_structured(
                 prompt, 
                 example_schema=execution_schema,
-                system_prompt="You are a precise agent that executes tasks using tools."
+                system_prompt="You are a precise agent that executes tasks using tools.",
+                on_token=on_token,
+                name="execute"
             )
             
             tool_name = decision.get("tool")
+            calls = decision.get("calls")
             
-            if tool_name and tool_name.lower() != "null" and tool_name.lower() != "none":
+            if isinstance(calls, list) and calls:
+                # Several independent tool calls in one decision run concurrently
+                calls = [c for c in calls if isinstance(c, dict) and c.get("tool")]
+                print(f"LLM decided to use tools: {[c['tool'] for c in calls]}")
+                outputs = self.tools.execute_tools_batch(calls)
+                result = "\n".join(f"Tool '{c['tool']}' Output: {out}" for c, out in zip(calls, outputs))
+            elif tool_name and tool_name.lower() != "null" and tool_name.lower() != "none":
                 print(f"LLM decided to use tool: {tool_name}")
                 args = decision.get("args", {})
                 # Securely execute tool (no eval in nodes.py, relies on tool implementation)
@@ -138,14 +271,46 @@ class AgentNodes:
             else:
                 result = decision.get("response", "Step processed without tools.")
                 
+        except LLMUnavailableError:
+            # Not a step failure reflect could act on; stop the run so it can be resumed
+            raise
         except Exception as e:
             print(f"Error executing step: {e}")
             result = f"Error: {str(e)}"
 
-        return {
-            "past_steps": [{"step": current_step, "result": result}],
-            # We don't increment index here, we let the reflect node decide
+        return result
+
+    def _reflect_decision(self, plan: List[str], index: int, result: str, retry_count: int) -> Dict[str, Any]:
+        """Ask the supervisor LLM whether to retry, replan or move on"""
+        from agent.utils.prompt_loader import prompt_loader
+        template = prompt_loader.get("reflect_template")
+        max_result_tokens = config.get("llm.prompt.max_result_tokens", 400)
+        llm = self.llm.for_node("reflect")
+        # The current step's neighbourhood of the plan is kept first
+        prompt = build_prompt("reflect", template, {"index": index}, [
+            PromptSection("result", [result], priority=0, max_item_tokens=max_result_tokens),
+            PromptSection("plan", [f"{i}. {step}" for i, step in enumerate(plan)], priority=1, anchor=index,
+                          max_item_tokens=max_result_tokens)
+        ], model=llm.llm_model_name)
+        
+        # Force replan if too many retries
+        if retry_count >= MAX_STEP_EXECUTIONS:
+            prompt += f"\n\nCRITICAL: You have retried this step {retry_count} times. You MUST choose 'replan' and provide a simplified or alternative plan."
+        
+        reflect_schema = {
+            "action": "retry | replan | next",
+            "reason": "explanation",
+            "new_plan": ["step1", "step2"] 
         }
+        
+        decision = llm.generate_structured(
+            prompt, 
+            example_schema=reflect_schema,
+            system_prompt="You are a supervisor managing a task plan.",
+            name="reflect"
+        )
+        print(f"Reflect Decision: {decision.get('action')} - {decision.get('reason')}")
+        return decision
 
     def reflect_node(self, state: AgentState) -> Dict[str, Any]:
         """Reflect on the past step and decide next move"""
@@ -170,35 +335,15 @@ class AgentNodes:
 
         # If last result contains Error, trigger LLM to decide
         # Also trigger if retry count is high to see if we should replan
-        is_error = "Error" in last_step_result or "Failed" in last_step_result
+        is_error = is_error_result(last_step_result)
         
         if is_error or retry_count > 1:
-             from agent.utils.prompt_loader import prompt_loader
-             template = prompt_loader.get("reflect_template")
-             prompt = template.format(plan=plan, index=index, result=last_step_result)
-             
-             # Force replan if too many retries
-             if retry_count >= 3:
-                 prompt += "\n\nCRITICAL: You have retried this step 3 times. You MUST choose 'replan' and provide a simplified or alternative plan."
-             
-             reflect_schema = {
-                 "action": "retry | replan | next",
-                 "reason": "explanation",
-                 "new_plan": ["step1", "step2"] 
-             }
-             
              try:
-                 decision = self.llm.generate_structured(
-                     prompt, 
-                     example_schema=reflect_schema,
-                     system_prompt="You are a supervisor managing a task plan."
-                 )
-                 
+                 decision = self._reflect_decision(plan, index, last_step_result, retry_count)
                  action = decision.get("action")
-                 print(f"Reflect Decision: {action} - {decision.get('reason')}")
                  
                  if action == "retry":
-                     if retry_count >= 3:
+                     if retry_count >= MAX_STEP_EXECUTIONS:
                          print("Reflect decided retry but limit reached. Forcing Replan request.")
                          # Fallback if LLM stubbornly says retry
                          # Actually if it fails to replan, we might get stuck. 
@@ -208,9 +353,16 @@ class AgentNodes:
                  elif action == "replan":
                      new_plan = decision.get("new_plan", [])
                      if new_plan:
-                         return {"plan": new_plan, "current_step_index": 0} # Reset to new plan
+                         return {
+                             "plan": new_plan,
+                             "step_dependencies": sequential_dependencies(new_plan),
+                             "current_step_index": 0,
+                             "plan_started_at": len(past_steps)
+                         } # Reset to new plan
                      else:
                          print("Warning: Replan requested but no plan provided. Continuing.")
+             except LLMUnavailableError:
+                 raise
              except Exception as e:
                  print(f"Reflect Logic Failed: {e}. Defaulting to next step.")
 
@@ -220,11 +372,73 @@ class AgentNodes:
         
         response = None
         if is_finished:
-            # Aggregate results
-            results = "\n".join([f"Step: {s.get('step', 'Unknown')}\nResult: {s.get('result', 'Unknown')}" for s in past_steps])
-            response = f"Task Completed.\nSummary:\n{results}"
+            response = self._final_response(past_steps)
         
         return {
             "current_step_index": new_index,
             "response": response
         }
+
+    def reflect_parallel_node(self, state: AgentState) -> Dict[str, Any]:
+        """Join the results of the last concurrent batch and decide next move"""
+        print("--- Reflect Node (parallel) ---")
+        plan = state["plan"]
+        past_steps = state.get("past_steps", [])
+        completed = list(state.get("completed_steps", []))
+        batch = state.get("last_batch", [])
+        batch_results = past_steps[-len(batch):] if batch else []
+        # Earlier plans may have had a step with the same index and text; don't count those
+        current_plan_steps = past_steps[state.get("plan_started_at", 0):]
+
+        for entry in batch_results:
+            index = entry["index"]
+            result = entry["result"]
+            # Executions of this step in the current plan
+            retry_count = sum(1 for s in current_plan_steps if s.get("index") == index and s.get("step") == plan[index])
+            print(f"Step {index + 1}: {plan[index]} (Executions: {retry_count})")
+
+            action = "next"
+            if is_error_result(result) or retry_count > 1:
+                try:
+                    decision = self._reflect_decision(plan, index, result, retry_count)
+                    action = decision.get("action")
+                    if action == "retry" and retry_count >= MAX_STEP_EXECUTIONS:
+                        # The prompt already demanded a replan; don't loop on this step forever
+                        print(f"Retry limit reached for step {index + 1}. Moving on.")
+                        action = "next"
+                    if action == "replan":
+                        new_plan = decision.get("new_plan", [])
+                        if new_plan:
+                            return {
+                                "plan": new_plan,
+                                "step_dependencies": sequential_dependencies(new_plan),
+                                "completed_steps": [],
+                                "last_batch": [],
+                                "plan_started_at": len(past_steps)
+                            }
+                        print("Warning: Replan requested but no plan provided. Continuing.")
+                        action = "next"
+                except LLMUnavailableError:
+                    raise
+                except Exception as e:
+                    print(f"Reflect Logic Failed: {e}. Defaulting to next step.")
+                    action = "next"
+
+            # Retried steps stay pending and are picked up by the next batch
+            if action != "retry" and index not in completed:
+                completed.append(index)
+
+        response = None
+        if len(completed) >= len(plan):
+            response = self._final_response(past_steps)
+
+        return {
+            "completed_steps": sorted(completed),
+            "current_step_index": len(completed),
+            "response": response
+        }
+
+    def _final_response(self, past_steps: List[Dict[str, Any]]) -> str:
+        # Aggregate results
+        results = "\n".join([f"Step: {s.get('step', 'Unknown')}\nResult: {s.get('result', 'Unknown')}" for s in past_steps])
+        return f"Task Completed.\nSummary:\n{results}"
@@ -4,8 +4,28 @@ import operator
 class AgentState(TypedDict):
     input: str
     plan: List[str]
+    step_dependencies: List[List[int]] # Per step, indices of the steps it waits for
+    completed_steps: List[int] # Used by the parallel scheduler
+    last_batch: List[int] # Steps dispatched by the last parallel execute
     current_step_index: int
-    past_steps: Annotated[List[Dict[str, str]], operator.add]
+    past_steps: Annotated[List[Dict[str, Any]], operator.add]
     response: Optional[str]
     scratchpad: Dict[str, Any]
     summary: Optional[str] # For memory compression
+    summarized_upto: int # past_steps[:summarized_upto] are covered by summary
+    plan_started_at: int # past_steps[plan_started_at:] were executed under the current plan
+
+
+def make_initial_state(task: str) -> AgentState:
+    return {
+        "input": task,
+        "plan": [],
+        "step_dependencies": [],
+        "completed_steps": [],
+        "current_step_index": 0,
+        "past_steps": [],
+        "summarized_upto": 0,
+        "plan_started_at": 0,
+        "response": None,
+        "scratchpad": {}
+    }
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from agent.utils.config import config
+from agent.utils.logger import logger
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM completions.
+    Tier 1 is an in-process LRU, tier 2 an optional SQLite file shared across runs.
+    Entries are keyed on (model, system prompt, prompt, temperature) and expire after ttl seconds.
+    With an embedding function, a prompt that misses exactly can still hit an entry
+    whose prompt is semantically equivalent (same model/system prompt/temperature).
+    """
+    def __init__(self, max_entries: int = 512, ttl: Optional[float] = 3600,
+                 sqlite_path: Optional[str] = None, max_disk_entries: int = 10000,
+                 embedding_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.embedding_fn = embedding_fn
+        self.similarity_threshold = similarity_threshold
+
+        # key -> (value, created_at)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # key -> (scope, normalized prompt embedding), only used in semantic mode
+        self._vectors: Dict[str, Tuple[str, List[float]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "semantic_hits": 0, "disk_hits": 0, "evictions": 0}
+
+        self._db = None
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls, embedding_fn=None) -> Optional["ResponseCache"]:
+        """Build the cache described by llm.cache, or None if caching is disabled"""
+        if not config.get("llm.cache.enabled", False):
+            return None
+        # A cached answer replays one sample; with temperature > 0 callers expect fresh ones
+        temperature = config.get("llm.temperature", 0.7)
+        if temperature != 0 and not config.get("llm.cache.sampled", False):
+            logger.info(f"LLM response cache off: llm.temperature is {temperature} (set llm.cache.sampled to cache anyway)")
+            return None
+        semantic = config.get("llm.cache.semantic", False)
+        return cls(
+            max_entries=config.get("llm.cache.max_entries", 512),
+            ttl=config.get("llm.cache.ttl", 3600),
+            sqlite_path=config.get("llm.cache.sqlite_path"),
+            max_disk_entries=config.get("llm.cache.max_disk_entries", 10000),
+            embedding_fn=embedding_fn if semantic else None,
+            similarity_threshold=config.get("llm.cache.similarity_threshold", 0.95),
+        )
+
+    @staticmethod
+    def _scope(model: str, system_prompt: Optional[str], temperature: float) -> str:
+        raw = json.dumps([model, system_prompt or "", temperature])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def make_key(cls, model: str, system_prompt: Optional[str], prompt: str, temperature: float) -> str:
+        scope = cls._scope(model, system_prompt, temperature)
+        return hashlib.sha256((scope + "\x00" + prompt).encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, model: str, system_prompt: Optional[str], prompt: str, temperature: float) -> Optional[str]:
+        key = self.make_key(model, system_prompt, prompt, temperature)
+
+        with self._lock:
+            value = self._get_memory(key)
+            if value is None:
+                value = self._get_disk(key)
+                if value is not None:
+                    self.stats["disk_hits"] += 1
+            if value is not None:
+                self.stats["hits"] += 1
+                return value
+
+        if self.embedding_fn:
+            value = self._get_semantic(model, system_prompt, prompt, temperature)
+            if value is not None:
+                with self._lock:
+                    self.stats["hits"] += 1
+                    self.stats["semantic_hits"] += 1
+                return value
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, model: str, system_prompt: Optional[str], prompt: str, temperature: float, value: str):
+        key = self.make_key(model, system_prompt, prompt, temperature)
+        now = time.time()
+
+        vector = None
+        if self.embedding_fn:
+            vector = self._embed(prompt)
+
+        with self._lock:
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors[key] = (self._scope(model, system_prompt, temperature), vector)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._vectors.pop(evicted, None)
+                self.stats["evictions"] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._trim_disk()
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, created_at = entry
+        if self._expired(created_at):
+            del self._entries[key]
+            self._vectors.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if self._expired(created_at):
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+
+        # Promote to the memory tier
+        self._entries[key] = (value, created_at)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._vectors.pop(evicted, None)
+            self.stats["evictions"] += 1
+        return value
+
+    def _trim_disk(self):
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.stats["evictions"] += overflow
+
+    def _embed(self, text: str) -> Optional[List[float]]:
+        try:
+            vector = [float(x) for x in self.embedding_fn([text])[0]]
+        except Exception as e:
+            logger.warning(f"Response cache embedding failed: {e}")
+            return None
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def _get_semantic(self, model: str, system_prompt: Optional[str], prompt: str, temperature: float) -> Optional[str]:
+        query = self._embed(prompt)
+        if query is None:
+            return None
+        scope = self._scope(model, system_prompt, temperature)
+
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for key, (entry_scope, vector) in self._vectors.items():
+                if entry_scope != scope:
+                    continue
+                score = sum(a * b for a, b in zip(query, vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            value = self._get_memory(best_key)
+            if value is not None:
+                logger.debug(f"Semantic cache hit (similarity {best_score:.3f})")
+            return value
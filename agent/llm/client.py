@@ -1,103 +1,499 @@
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Iterator, Tuple
 from agent.utils.config import config
 from agent.utils.logger import logger
-from openai import OpenAI
+from agent.llm.cache import ResponseCache
+from agent.llm.json_repair import loads_lenient
+from agent.utils.tokens import count_tokens
+from agent.utils.tracing import tracer
+import asyncio
+import copy
 import json
-import re
+import threading
+
+
+def _pool_limits():
+    """Connection pool limits shared by the sync and async clients"""
+    import httpx
+    return httpx.Limits(
+        max_connections=config.get("llm.pool.max_connections", 20),
+        max_keepalive_connections=config.get("llm.pool.max_keepalive_connections", 10),
+        keepalive_expiry=config.get("llm.pool.keepalive_expiry", 30),
+    )
+
+
+def _build_messages(prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def _structured_system_prompt(example_schema: Dict[str, Any], system_prompt: Optional[str] = None) -> str:
+    schema_str = json.dumps(example_schema, indent=2)
+    system_instruction = f"""
+You are a precise JSON generator. 
+You must output VALID JSON matching exactly this schema:
+{schema_str}
+Do not output any markdown formatting like ```json or ```. Just the raw JSON object.
+"""
+    return system_prompt + "\n" + system_instruction if system_prompt else system_instruction
+
+
+# Structured output modes, strongest first. "auto" starts at json_schema and steps
+# down whenever a server rejects the response_format it was sent
+STRUCTURED_MODES = ["json_schema", "json_object", "prompt"]
+
+# Per caller (e.g. "execute", "reflect"): structured calls, LLM attempts, responses
+# fixed by the JSON repair parser, re-prompts, failures and mode downgrades
+structured_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, **deltas: int):
+    with _stats_lock:
+        stats = structured_stats.setdefault(name, {"calls": 0, "attempts": 0, "repaired": 0, "reprompts": 0, "failed": 0, "downgrades": 0})
+        for key, delta in deltas.items():
+            stats[key] += delta
+
+
+def format_structured_stats() -> str:
+    lines = [f"{'caller':<12}{'calls':>7}{'attempts':>10}{'retry rate':>12}{'repaired':>10}{'failed':>8}{'downgrades':>12}"]
+    with _stats_lock:
+        for name, s in structured_stats.items():
+            # Share of LLM calls that were re-prompts
+            rate = s["reprompts"] / s["attempts"] if s["attempts"] else 0.0
+            lines.append(f"{name:<12}{s['calls']:>7}{s['attempts']:>10}{rate:>12.1%}{s['repaired']:>10}{s['failed']:>8}{s['downgrades']:>12}")
+    return "\n".join(lines)
+
+
+def schema_from_example(example: Any) -> Dict[str, Any]:
+    """
+    JSON Schema for an example object like {"action": "retry | replan | next", "args": {...}}.
+    Example strings are placeholders, so they allow any string (or null); "a | b | c"
+    becomes an enum. Properties are optional and extra ones allowed, because callers
+    accept alternative shapes (e.g. "calls" instead of "tool").
+    """
+    if isinstance(example, dict):
+        return {"type": "object", "properties": {k: schema_from_example(v) for k, v in example.items()}}
+    if isinstance(example, list):
+        return {"type": "array", "items": schema_from_example(example[0])} if example else {"type": "array"}
+    if isinstance(example, bool):
+        return {"type": "boolean"}
+    if isinstance(example, (int, float)):
+        return {"type": "number"}
+    if isinstance(example, str) and " | " in example:
+        return {"enum": [option.strip() for option in example.split("|")]}
+    return {"type": ["string", "null"]}
+
+
+def _response_format(mode: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if mode == "json_schema":
+        # Not strict: strict mode would force every property to be required
+        return {"type": "json_schema", "json_schema": {"name": "response", "schema": schema, "strict": False}}
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+def _is_format_rejection(error: Exception) -> bool:
+    """The server refused the request itself (unsupported response_format), not a transport failure"""
+    return getattr(error, "status_code", None) in (400, 422)
+
+
+def _parse_structured(response: str) -> Tuple[Dict[str, Any], bool]:
+    result, repaired = loads_lenient(response, expect_object=True)
+    if not isinstance(result, dict):
+        raise ValueError(f"Expected a JSON object, got {type(result).__name__}")
+    return result, repaired
+
+
+def _reprompt(prompt: str, response: str, error: Exception) -> str:
+    return prompt + f"\n\nError: Previous output was not valid JSON. \nOutput: {response}\nError: {str(error)}\nPlease correct it."
+
+
+def _structured_mode() -> Tuple[str, bool]:
+    """(starting mode, whether to step down on rejection) from llm.structured.mode"""
+    mode = config.get("llm.structured.mode", "auto")
+    if mode == "auto":
+        return STRUCTURED_MODES[0], True
+    if mode not in STRUCTURED_MODES:
+        logger.warning(f"Unknown llm.structured.mode {mode}, using prompt")
+        return "prompt", False
+    return mode, False
+
 
 class LLMClient:
-    def __init__(self):
+    def __init__(self, cache: Optional[ResponseCache] = None, router=None):
         self.api_key = config.get("llm.api_key", "lm-studio")
-        self.base_url = config.get("llm.api_base", "http://127.0.0.1:1234/v1")
         self.llm_model_name = config.get("llm.model", "gpt-3.5-turbo")
+        self.timeout = config.get("llm.timeout", 60)
+        self.temperature = config.get("llm.temperature", 0.7)
+        self.cache = cache if cache is not None else ResponseCache.from_config()
         
-        logger.info(f"Initializing LLM Client with base_url: {self.base_url}")
-        
-        self.client = OpenAI(
-            base_url=self.base_url,
-            api_key=self.api_key
-        )
+        logger.info(f"Initializing LLM Client for model {self.llm_model_name}")
         
-        # Logic to bypass OpenAI library validation for local servers
-        if "localhost" in self.base_url or "127.0.0.1" in self.base_url:
-            self.model_name = "gpt-3.5-turbo" # Override to pass client validation
-            logger.info(f"Local LLM detected. Using '{self.model_name}' as alias for '{self.llm_model_name}'")
-        else:
-            self.model_name = self.llm_model_name
+        # Requests are spread over the llm.endpoints (or the single api_base), each with
+        # a keep-alive pool, failover and retries; openai/httpx load with the first client
+        from agent.llm.router import LLMRouter
+        self.router = router if router is not None else LLMRouter.from_config()
+
+        self.structured_mode, self._auto_downgrade = _structured_mode()
+        self._node_clients: Dict[str, "LLMClient"] = {}
+        # generate_many's AsyncLLMClient and the private event loop it lives on
+        self._async_client: Optional["AsyncLLMClient"] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_lock = threading.Lock()
+
+    def for_node(self, node: str) -> "LLMClient":
+        """
+        The client a graph node should use: llm.node_models can give a node its own
+        model (e.g. a small one for reflect). Views share the router and the cache;
+        each gets its own generate_many client, which this client's close() shuts down.
+        """
+        model = (config.get("llm.node_models", {}) or {}).get(node)
+        if not model or model == self.llm_model_name:
+            return self
+        if node not in self._node_clients:
+            view = copy.copy(self)
+            view.llm_model_name = model
+            view._async_client, view._async_loop = None, None
+            view._async_lock = threading.Lock()
+            self._node_clients[node] = view
+        return self._node_clients[node]
 
-    def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, use_cache: bool = True,
+                 on_token: Optional[Callable[[str], None]] = None) -> str:
         """
         Generates a response from the LLM.
+        If on_token is given, the completion is streamed and each delta is passed to it.
+        Raises the router's error (e.g. LLMUnavailableError) if no endpoint could answer.
         """
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        if use_cache and self.cache:
+            cached = self.cache.get(self.llm_model_name, system_prompt, prompt, self.temperature)
+            if cached is not None:
+                logger.debug("LLM Response served from cache")
+                with tracer.span("generate", kind="llm", model=self.llm_model_name, cached=True):
+                    if on_token:
+                        on_token(cached)
+                return cached
 
         try:
-            logger.debug(f"LLM Request: {messages}")
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.7
-            )
-            response = completion.choices[0].message.content
-            logger.debug(f"LLM Response: {response[:100]}...")
-            return response
+            response = self._generate(_build_messages(prompt, system_prompt), on_token)
         except Exception as e:
             logger.error(f"LLM Generation failed: {e}")
-            return f"Error generating response: {e}"
+            raise
+
+        if use_cache and self.cache and response is not None:
+            self.cache.set(self.llm_model_name, system_prompt, prompt, self.temperature, response)
+        return response
 
-    def generate_structured(self, prompt: str, example_schema: Dict[str, Any], system_prompt: Optional[str] = None, max_retries: int = 3) -> Dict[str, Any]:
+    def _generate(self, messages: List[Dict[str, str]], on_token: Optional[Callable[[str], None]] = None,
+                  response_format: Optional[Dict[str, Any]] = None) -> str:
+        """One completion request, traced; raises on failure"""
+        with tracer.span("generate", kind="llm", model=self.llm_model_name, stream=on_token is not None,
+                         response_format=response_format["type"] if response_format else None) as span:
+            extra = {"response_format": response_format} if response_format else {}
+            usage = None
+            logger.debug(f"LLM Request: {messages}")
+            if on_token:
+                chunks = []
+                for delta in self._stream_messages(messages, **extra):
+                    chunks.append(delta)
+                    on_token(delta)
+                response = "".join(chunks)
+            else:
+                completion = self.router.create(
+                    self.llm_model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    **extra
+                )
+                response = completion.choices[0].message.content
+                usage = completion.usage
+            logger.debug(f"LLM Response: {(response or '')[:100]}...")
+
+            if tracer.enabled:
+                # Streamed completions carry no usage block, so count locally
+                if usage is not None:
+                    span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                else:
+                    span.set(prompt_tokens=count_tokens("".join(m["content"] for m in messages), self.llm_model_name),
+                             completion_tokens=count_tokens(response or "", self.llm_model_name))
+            return response
+
+    def generate_structured(self, prompt: str, example_schema: Dict[str, Any], system_prompt: Optional[str] = None, max_retries: int = 3,
+                            on_token: Optional[Callable[[str], None]] = None, name: str = "structured") -> Dict[str, Any]:
         """
         Generates a structured JSON response.
+        The server is asked for schema-constrained output (response_format) when it
+        supports it; otherwise the schema in the system prompt has to do. A response
+        that still does not parse goes through the JSON repair parser, and only if
+        that fails too is the model re-prompted with the error. name keys the
+        structured_stats entry (e.g. the calling node).
         """
-        schema_str = json.dumps(example_schema, indent=2)
-        system_instruction = f"""
-You are a precise JSON generator. 
-You must output VALID JSON matching exactly this schema:
-{schema_str}
-Do not output any markdown formatting like ```json or ```. Just the raw JSON object.
-"""
-        
-        final_system_prompt = system_prompt + "\n" + system_instruction if system_prompt else system_instruction
+        final_system_prompt = _structured_system_prompt(example_schema, system_prompt)
+
+        # Only successfully parsed objects are cached, so a malformed completion
+        # is never replayed into the retry loop
+        if self.cache:
+            cached = self.cache.get(self.llm_model_name, final_system_prompt, prompt, self.temperature)
+            if cached is not None:
+                try:
+                    result = json.loads(cached)
+                    if on_token:
+                        on_token(cached)
+                    return result
+                except json.JSONDecodeError:
+                    pass
         
+        _count(name, calls=1)
+        schema = schema_from_example(example_schema)
         current_prompt = prompt
         
+        # The generate spans nest under this one; attempts > 1 are retries
+        with tracer.span("generate_structured", kind="llm", model=self.llm_model_name, caller=name) as span:
+            for attempt in range(max_retries):
+                span.set(attempts=attempt + 1)
+                response = self._structured_attempt(_build_messages(current_prompt, final_system_prompt), schema, on_token, name)
+                span.set(mode=self.structured_mode)
+                
+                try:
+                    result, repaired = _parse_structured(response)
+                except ValueError as e:
+                    logger.warning(f"JSON Parse Error (Attempt {attempt+1}): {e}")
+                    span.set(parse_failures=attempt + 1)
+                    _count(name, reprompts=1)
+                    current_prompt = _reprompt(prompt, response, e)
+                    continue
+                if repaired:
+                    logger.debug("Structured response fixed by the JSON repair parser")
+                    span.set(repaired=True)
+                    _count(name, repaired=1)
+                if self.cache:
+                    self.cache.set(self.llm_model_name, final_system_prompt, prompt, self.temperature, json.dumps(result))
+                return result
+                    
+            _count(name, failed=1)
+            raise ValueError("Failed to generate valid JSON after retries.")
+
+    def _structured_attempt(self, messages: List[Dict[str, str]], schema: Dict[str, Any],
+                            on_token: Optional[Callable[[str], None]], name: str) -> str:
+        """
+        One structured completion, stepping down the structured modes while the server
+        rejects them. Other errors (e.g. LLMUnavailableError) are raised.
+        """
+        while True:
+            mode = self.structured_mode
+            response_format = _response_format(mode, schema)
+            _count(name, attempts=1)
+            try:
+                return self._generate(messages, on_token, response_format)
+            except Exception as e:
+                if response_format is not None and self._auto_downgrade and _is_format_rejection(e):
+                    # Sticky for this client, so later calls skip the failed mode. Parallel
+                    # steps share the client; only the first of them steps the mode down
+                    if self.structured_mode == mode:
+                        self.structured_mode = STRUCTURED_MODES[STRUCTURED_MODES.index(mode) + 1]
+                        logger.info(f"Server rejected response_format {mode} ({e}), falling back to {self.structured_mode}")
+                        _count(name, downgrades=1)
+                    continue
+                # Transport failures were already retried by the router; parsing an error
+                # string as JSON would only burn the re-prompts, so let the caller see it
+                logger.error(f"LLM Generation failed: {e}")
+                raise
+
+    def stream(self, prompt: str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams the completion, yielding text deltas as they arrive.
+        """
+        messages = _build_messages(prompt, system_prompt)
+        logger.debug(f"LLM Stream Request: {messages}")
+        yield from self._stream_messages(messages)
+
+    def _stream_messages(self, messages: List[Dict[str, str]], **extra) -> Iterator[str]:
+        for chunk in self.router.stream(self.llm_model_name, messages=messages, temperature=self.temperature, **extra):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def generate_many(self, prompts: List[str], system_prompt: Optional[str] = None, max_concurrency: Optional[int] = None) -> List[str]:
+        """
+        Generates responses for several prompts concurrently.
+        Blocking convenience wrapper around AsyncLLMClient.generate_many.
+        The async client and its connection pool are kept for the life of this
+        client, so consecutive batches reuse keep-alive connections.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("LLMClient.generate_many blocks; from async code use AsyncLLMClient.generate_many")
+        future = asyncio.run_coroutine_threadsafe(
+            self._get_async_client().generate_many(prompts, system_prompt=system_prompt, max_concurrency=max_concurrency),
+            self._async_loop
+        )
+        return future.result()
+
+    def _get_async_client(self) -> "AsyncLLMClient":
+        # Async pools are bound to the loop they were first used on, so the client
+        # gets a loop of its own that runs for as long as this LLMClient is open
+        with self._async_lock:
+            if self._async_client is None:
+                self._async_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._async_loop.run_forever, name="llm-async", daemon=True).start()
+                self._async_client = AsyncLLMClient()
+                self._async_client.llm_model_name = self.llm_model_name
+            return self._async_client
+
+    def chat(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Chat completion interface.
+        """
+        try:
+            completion = self.router.create(
+                self.llm_model_name,
+                messages=messages,
+                temperature=self.temperature
+            )
+            return completion.choices[0].message.content
+        except Exception as e:
+            logger.error(f"LLM Chat failed: {e}")
+            raise
+
+    def close(self):
+        self.router.close()
+        for view in self._node_clients.values():
+            view._close_async()
+        self._close_async()
+
+    def _close_async(self):
+        with self._async_lock:
+            if self._async_client is not None:
+                asyncio.run_coroutine_threadsafe(self._async_client.aclose(), self._async_loop).result()
+                self._async_loop.call_soon_threadsafe(self._async_loop.stop)
+                self._async_client, self._async_loop = None, None
+
+
+class AsyncLLMClient:
+    """
+    Asyncio counterpart of LLMClient.
+    All requests share one size-bounded keep-alive connection pool, so calls
+    issued from concurrent tasks overlap on the serving side instead of queueing.
+    """
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.api_key = config.get("llm.api_key", "lm-studio")
+        self.llm_model_name = config.get("llm.model", "gpt-3.5-turbo")
+        self.timeout = config.get("llm.timeout", 60)
+        self.temperature = config.get("llm.temperature", 0.7)
+        self.max_concurrency = max_concurrency or config.get("llm.max_concurrency", 8)
+
+        logger.info(f"Initializing Async LLM Client for model {self.llm_model_name}")
+
+        # Async pools are bound to the event loop, so this client gets its own router
+        from agent.llm.router import LLMRouter
+        self.router = LLMRouter.from_config(asynchronous=True)
+
+        self.structured_mode, self._auto_downgrade = _structured_mode()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.router.aclose()
+
+    async def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        try:
+            return await self._generate(_build_messages(prompt, system_prompt))
+        except Exception as e:
+            logger.error(f"LLM Generation failed: {e}")
+            raise
+
+    async def _generate(self, messages: List[Dict[str, str]], response_format: Optional[Dict[str, Any]] = None) -> str:
+        with tracer.span("generate", kind="llm", model=self.llm_model_name,
+                         response_format=response_format["type"] if response_format else None) as span:
+            logger.debug(f"LLM Request: {messages}")
+            extra = {"response_format": response_format} if response_format else {}
+            completion = await self.router.acreate(
+                self.llm_model_name,
+                messages=messages,
+                temperature=self.temperature,
+                **extra
+            )
+            response = completion.choices[0].message.content
+            if completion.usage is not None:
+                span.set(prompt_tokens=completion.usage.prompt_tokens, completion_tokens=completion.usage.completion_tokens)
+            logger.debug(f"LLM Response: {(response or '')[:100]}...")
+            return response
+
+    async def generate_structured(self, prompt: str, example_schema: Dict[str, Any], system_prompt: Optional[str] = None, max_retries: int = 3,
+                                  name: str = "structured") -> Dict[str, Any]:
+        """Same strategy as LLMClient.generate_structured: response_format, then repair, then re-prompt"""
+        final_system_prompt = _structured_system_prompt(example_schema, system_prompt)
+        _count(name, calls=1)
+        schema = schema_from_example(example_schema)
+
+        current_prompt = prompt
+
         for attempt in range(max_retries):
-            response = self.generate(current_prompt, system_prompt=final_system_prompt)
-            
-            # Cleaning response
-            cleaned_response = response.strip()
-            # Remove markdown code blocks if present
-            cleaned_response = re.sub(r'^```json\s*', '', cleaned_response)
-            cleaned_response = re.sub(r'^```\s*', '', cleaned_response)
-            cleaned_response = re.sub(r'\s*```$', '', cleaned_response)
-            
-            # Try finding JSON object
-            match = re.search(r'\{[\s\S]*\}', cleaned_response)
-            if match:
-                cleaned_response = match.group(0)
-            
+            response = await self._structured_attempt(_build_messages(current_prompt, final_system_prompt), schema, name)
+
             try:
-                return json.loads(cleaned_response)
-            except json.JSONDecodeError as e:
+                result, repaired = _parse_structured(response)
+            except ValueError as e:
                 logger.warning(f"JSON Parse Error (Attempt {attempt+1}): {e}")
-                current_prompt = prompt + f"\n\nError: Previous output was not valid JSON. \nOutput: {response}\nError: {str(e)}\nPlease correct it."
-                
+                _count(name, reprompts=1)
+                current_prompt = _reprompt(prompt, response, e)
+                continue
+            if repaired:
+                _count(name, repaired=1)
+            return result
+
+        _count(name, failed=1)
         raise ValueError("Failed to generate valid JSON after retries.")
 
-    def chat(self, messages: List[Dict[str, str]]) -> str:
+    async def _structured_attempt(self, messages: List[Dict[str, str]], schema: Dict[str, Any], name: str) -> str:
+        while True:
+            mode = self.structured_mode
+            response_format = _response_format(mode, schema)
+            _count(name, attempts=1)
+            try:
+                return await self._generate(messages, response_format)
+            except Exception as e:
+                if response_format is not None and self._auto_downgrade and _is_format_rejection(e):
+                    # Concurrent calls may race here; only the first one steps the mode down
+                    if self.structured_mode == mode:
+                        self.structured_mode = STRUCTURED_MODES[STRUCTURED_MODES.index(mode) + 1]
+                        logger.info(f"Server rejected response_format {mode} ({e}), falling back to {self.structured_mode}")
+                        _count(name, downgrades=1)
+                    continue
+                logger.error(f"LLM Generation failed: {e}")
+                raise
+
+    async def generate_many(self, prompts: List[str], system_prompt: Optional[str] = None, max_concurrency: Optional[int] = None) -> List[str]:
         """
-        Chat completion interface.
+        Issues all prompts concurrently, at most max_concurrency in flight.
+        Results are returned in the same order as prompts; the first failure is raised.
         """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def _bounded(prompt: str) -> str:
+            async with semaphore:
+                return await self.generate(prompt, system_prompt=system_prompt)
+
+        return await asyncio.gather(*[_bounded(p) for p in prompts])
+
+    async def chat(self, messages: List[Dict[str, str]]) -> str:
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
+            completion = await self.router.acreate(
+                self.llm_model_name,
                 messages=messages,
-                temperature=0.7
+                temperature=self.temperature
             )
             return completion.choices[0].message.content
         except Exception as e:
             logger.error(f"LLM Chat failed: {e}")
-            return f"Error in chat: {e}"
+            raise
@@ -0,0 +1,156 @@
+import json
+import re
+from typing import Any, Tuple
+
+_FENCE = re.compile(r'^```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+# A key left without its value at the end of truncated output: {"a": 1, "b":
+_DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+_LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+
+
+def _start(text: str) -> int:
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON object or array in response")
+    return min(starts)
+
+
+def _repair(text: str, start: int) -> str:
+    """
+    Single pass over text from the bracket at start, rewriting the usual LLM slips into
+    valid JSON: single-quoted strings, raw newlines in strings, Python literals,
+    unquoted keys, trailing commas, and output cut off mid-value (open strings and
+    containers are closed, a dangling key is dropped). Text after the top-level
+    value is ignored.
+    """
+    out = []
+    stack = []
+    quote = None
+    escape = False
+    i = start
+
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            _strip_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                break
+        elif ch.isdigit() or ch == "-":
+            end = i + 1
+            while end < len(text) and (text[end].isdigit() or text[end] in ".eE+-"):
+                end += 1
+            number = text[i:end]
+            if end == len(text):
+                # Cut off mid-number ("2.", "1e")
+                number = number.rstrip(".eE+-")
+            out.append(number)
+            i = end
+            continue
+        elif ch.isalpha() or ch == "_":
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] in "_-"):
+                end += 1
+            word = text[i:end]
+            rest = text[end:].lstrip()
+            if rest.startswith(":"):
+                out.append(json.dumps(word))
+            else:
+                out.append(_LITERALS.get(word, json.dumps(word)))
+            i = end
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote:
+        if escape:
+            out.pop()
+        out.append('"')
+
+    repaired = "".join(out).rstrip()
+    if stack:
+        # Truncated: drop an incomplete trailing member before closing the containers
+        if stack[-1] == "}":
+            repaired = _DANGLING_KEY.sub(r"\1", repaired)
+        repaired = repaired.rstrip().rstrip(",").rstrip()
+        if repaired.endswith(":"):
+            repaired += " null"
+        repaired += "".join(reversed(stack))
+    return repaired
+
+
+def _strip_trailing_comma(out: list):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def loads_lenient(text: str, expect_object: bool = False) -> Tuple[Any, bool]:
+    """
+    Parse the first JSON value in an LLM response, repairing it if needed.
+    With expect_object, brackets in leading prose ("Note [1]: {...}") are skipped:
+    each "{" is tried in turn, first as is and then repaired, and only if none
+    gives an object does parsing start at the first bracket of either kind.
+    Returns (value, repaired); raises ValueError if nothing usable is left.
+    """
+    cleaned = _FENCE.sub("", text.strip())
+    decoder = json.JSONDecoder()
+    if expect_object:
+        starts = [i for i, ch in enumerate(cleaned) if ch == "{"]
+        for start in starts:
+            try:
+                # raw_decode tolerates prose after the value
+                value, _ = decoder.raw_decode(cleaned[start:])
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, dict):
+                return value, False
+        for start in starts:
+            try:
+                value = json.loads(_repair(cleaned, start))
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, dict):
+                return value, True
+
+    start = _start(cleaned)
+    try:
+        value, _ = decoder.raw_decode(cleaned[start:])
+        return value, False
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_repair(cleaned, start)), True
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Unrepairable JSON: {e}") from e
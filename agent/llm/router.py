@@ -0,0 +1,297 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from agent.utils.config import config
+from agent.utils.logger import logger
+
+
+class LLMUnavailableError(Exception):
+    """Every endpoint that serves the model failed or is circuit-broken"""
+    pass
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Transport failures, timeouts, 429 and 5xx are worth another endpoint; other 4xx are the request's fault"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    import httpx
+    from openai import APIConnectionError, APITimeoutError
+    return isinstance(error, (APIConnectionError, APITimeoutError, httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive failures; open rejects calls
+    until reset_timeout has passed (or a health probe succeeds), then lets one trial
+    call through (half open). Its success closes the breaker, its failure reopens it.
+    """
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class Endpoint:
+    """One OpenAI-compatible server, with its own connection pool, load counter and breaker"""
+    def __init__(self, name: str, api_base: str, api_key: str = "lm-studio", models: Optional[List[str]] = None,
+                 timeout: float = 60, asynchronous: bool = False, breaker: Optional[CircuitBreaker] = None,
+                 default_model: Optional[str] = None):
+        self.name = name
+        self.api_base = api_base
+        self.api_key = api_key
+        self.models = models
+        self.default_model = default_model
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.stats = {"requests": 0, "failures": 0}
+
+        import httpx
+        from agent.llm.client import _pool_limits
+        # The router does the retrying, so the SDK's own retries are off
+        if asynchronous:
+            from openai import AsyncOpenAI
+            self.http_client = httpx.AsyncClient(limits=_pool_limits(), timeout=timeout)
+            self.client = AsyncOpenAI(base_url=api_base, api_key=api_key, http_client=self.http_client, max_retries=0)
+        else:
+            from openai import OpenAI
+            self.http_client = httpx.Client(limits=_pool_limits(), timeout=timeout)
+            self.client = OpenAI(base_url=api_base, api_key=api_key, http_client=self.http_client, max_retries=0)
+
+    @property
+    def is_local(self) -> bool:
+        return "localhost" in self.api_base or "127.0.0.1" in self.api_base
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def model_for(self, model: str) -> str:
+        # A local server without a model list serves whatever it has loaded; the default
+        # model keeps the old alias that passes client-side validation, while models
+        # picked per node are sent by name
+        if self.models is None and self.is_local and model == self.default_model:
+            return "gpt-3.5-turbo"
+        return model
+
+
+class LLMRouter:
+    """
+    Spreads completions over several OpenAI-compatible endpoints (llm.endpoints).
+    Each request goes to the endpoint serving the model with the fewest requests in
+    flight (ties broken at random), skipping endpoints whose circuit breaker is open.
+    Retryable failures are retried with full-jitter exponential backoff, on another
+    endpoint when there is one. A background probe (GET /models) re-checks broken
+    endpoints so they rejoin as soon as they are back.
+    Without llm.endpoints the single llm.api_base is the only endpoint.
+    """
+    def __init__(self, endpoints: List[Endpoint], max_retries: int = 2, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, health_interval: float = 0):
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if health_interval and health_interval > 0:
+            threading.Thread(target=self._probe_loop, args=(health_interval,), name="llm-health", daemon=True).start()
+
+    @classmethod
+    def from_config(cls, asynchronous: bool = False) -> "LLMRouter":
+        timeout = config.get("llm.timeout", 60)
+        specs = config.get("llm.endpoints", []) or [{
+            "name": "default",
+            "api_base": config.get("llm.api_base", "http://127.0.0.1:1234/v1"),
+            "api_key": config.get("llm.api_key", "lm-studio")
+        }]
+        endpoints = [
+            Endpoint(
+                spec.get("name") or spec["api_base"],
+                spec["api_base"],
+                api_key=spec.get("api_key") or config.get("llm.api_key", "lm-studio"),
+                models=spec.get("models"),
+                timeout=spec.get("timeout", timeout),
+                asynchronous=asynchronous,
+                breaker=CircuitBreaker(
+                    failure_threshold=config.get("llm.router.failure_threshold", 3),
+                    reset_timeout=config.get("llm.router.reset_timeout", 30)
+                ),
+                default_model=config.get("llm.model", "gpt-3.5-turbo")
+            )
+            for spec in specs
+        ]
+        for ep in endpoints:
+            logger.info(f"LLM endpoint {ep.name}: {ep.api_base} (models: {', '.join(ep.models) if ep.models else 'any'})")
+        return cls(
+            endpoints,
+            max_retries=config.get("llm.router.max_retries", 2),
+            backoff_base=config.get("llm.router.backoff_base", 0.5),
+            backoff_max=config.get("llm.router.backoff_max", 8),
+            # The async router lives only as long as one event loop, so it does not probe
+            health_interval=0 if asynchronous else config.get("llm.router.health_interval", 15)
+        )
+
+    def _acquire(self, model: str, tried: set) -> Endpoint:
+        """Least-outstanding endpoint for model, preferring ones this request has not failed on"""
+        with self._lock:
+            serving = [ep for ep in self.endpoints if ep.serves(model)]
+            if not serving:
+                raise LLMUnavailableError(f"No endpoint serves model {model}")
+            # Untried endpoints first, then ones already tried, lowest load first within each;
+            # a tried endpoint whose breaker is closed beats giving up on an open untried one.
+            # breaker.allow() hands out the half-open trial, so only ask the chosen one
+            for ep in sorted(serving, key=lambda ep: (ep.name in tried, ep.outstanding, random.random())):
+                if ep.breaker.allow():
+                    ep.outstanding += 1
+                    ep.stats["requests"] += 1
+                    return ep
+        raise LLMUnavailableError(f"All endpoints for model {model} are unavailable (circuit open)")
+
+    def _release(self, ep: Endpoint, error: Optional[Exception] = None):
+        with self._lock:
+            ep.outstanding -= 1
+        if error is None:
+            ep.breaker.record_success()
+        elif _is_retryable(error):
+            ep.stats["failures"] += 1
+            ep.breaker.record_failure()
+        else:
+            # The server answered; the request was at fault, not the endpoint
+            ep.breaker.record_success()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_or_raise(self, error: Exception, attempt: int, ep: Endpoint):
+        """Return if the request should be retried, raise otherwise"""
+        if not _is_retryable(error):
+            raise error
+        if attempt >= self.max_retries:
+            raise LLMUnavailableError(f"LLM request failed after {attempt + 1} attempts: {error}") from error
+        logger.warning(f"LLM endpoint {ep.name} failed ({error}), retrying ({attempt + 1}/{self.max_retries})")
+
+    def create(self, model: str, **kwargs) -> Any:
+        """chat.completions.create on the best endpoint, with retries and failover"""
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            ep = self._acquire(model, tried)
+            tried.add(ep.name)
+            try:
+                result = ep.client.chat.completions.create(model=ep.model_for(model), **kwargs)
+            except Exception as e:
+                self._release(ep, e)
+                self._retry_or_raise(e, attempt, ep)
+                time.sleep(self._backoff(attempt))
+                continue
+            self._release(ep)
+            return result
+
+    def stream(self, model: str, **kwargs) -> Iterator[Any]:
+        """
+        Streaming create. Opening the stream is retried like create(); once chunks
+        have been yielded a failure is raised, since the caller already saw output.
+        The endpoint counts as busy until the stream is closed.
+        """
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            ep = self._acquire(model, tried)
+            tried.add(ep.name)
+            try:
+                stream = ep.client.chat.completions.create(model=ep.model_for(model), stream=True, **kwargs)
+            except Exception as e:
+                self._release(ep, e)
+                self._retry_or_raise(e, attempt, ep)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            error = None
+            try:
+                yield from stream
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                stream.close()
+                self._release(ep, error)
+            return
+
+    async def acreate(self, model: str, **kwargs) -> Any:
+        """create() for routers built with asynchronous=True"""
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            ep = self._acquire(model, tried)
+            tried.add(ep.name)
+            try:
+                result = await ep.client.chat.completions.create(model=ep.model_for(model), **kwargs)
+            except Exception as e:
+                self._release(ep, e)
+                self._retry_or_raise(e, attempt, ep)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self._release(ep)
+            return result
+
+    def _probe_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            for ep in self.endpoints:
+                if ep.breaker.state == "closed":
+                    continue
+                try:
+                    ep.http_client.get(ep.api_base.rstrip("/") + "/models", timeout=5,
+                                       headers={"Authorization": f"Bearer {ep.api_key}"}).raise_for_status()
+                except Exception as e:
+                    logger.debug(f"LLM endpoint {ep.name} still down: {e}")
+                    continue
+                logger.info(f"LLM endpoint {ep.name} is healthy again")
+                ep.breaker.record_success()
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": ep.name, "state": ep.breaker.state, "outstanding": ep.outstanding, **ep.stats}
+            for ep in self.endpoints
+        ]
+
+    def close(self):
+        self._stop.set()
+        for ep in self.endpoints:
+            ep.http_client.close()
+
+    async def aclose(self):
+        for ep in self.endpoints:
+            await ep.http_client.aclose()
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from agent.utils.logger import logger
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk vector cache.
+    vectors.f32 holds the rows back to back as raw float32 and is read through a
+    memory map; keys.txt holds the content hash of row i on line i.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.keys_path = os.path.join(directory, "keys.txt")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.meta_path = os.path.join(directory, "meta.json")
+
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            self.dim = json.load(f)["dim"]
+
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, 'r', encoding='utf-8') as f:
+                keys = [line.strip() for line in f if line.strip()]
+        stored_rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        # A crash between the two appends leaves one file longer; only complete rows count
+        count = min(len(keys), stored_rows)
+        self.rows = {key: i for i, key in enumerate(keys[:count])}
+        self._remap(count)
+
+    def _remap(self, count: int):
+        if count:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(count, self.dim))
+        else:
+            self._matrix = None
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        return np.array(self._matrix[row])
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        with self._lock:
+            items = {k: v for k, v in items.items() if k not in self.rows}
+            if not items:
+                return
+            if self.dim is None:
+                self.dim = len(next(iter(items.values())))
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({"dim": self.dim}, f)
+
+            matrix = np.asarray(list(items.values()), dtype=np.float32).reshape(len(items), self.dim)
+            with open(self.vectors_path, 'ab') as f:
+                f.write(matrix.tobytes())
+            with open(self.keys_path, 'a', encoding='utf-8') as f:
+                f.write("".join(key + "\n" for key in items))
+
+            # Map the grown file before publishing the new rows, so a concurrent get
+            # never indexes past the matrix it reads
+            start = len(self.rows)
+            self._remap(start + len(items))
+            for offset, key in enumerate(items):
+                self.rows[key] = start + offset
+
+
+class EmbeddingService:
+    """
+    Shared text embedding layer.
+    Vectors are cached by content hash in an in-process LRU and, optionally, in a
+    memory-mapped DiskEmbeddingStore. Texts missing from both are encoded in batches;
+    concurrent callers coalesce, so whichever thread holds the model encodes every
+    text queued so far in one call.
+    """
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", device: str = "cpu",
+                 batch_size: int = 32, cache_size: int = 10000, cache_dir: Optional[str] = None):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.disk = DiskEmbeddingStore(os.path.join(cache_dir, model_name.replace("/", "_"))) if cache_dir else None
+
+        self._model = None
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+        self._pending_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "encoded": 0, "batches": 0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            logger.info(f"Loading embedding model {self.model_name}")
+            self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts, returning one float32 vector per input in order"""
+        keys = [content_hash(t) for t in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        missing: Dict[str, str] = {}
+
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                vectors[key] = vector
+
+        # Texts another caller took into its batch are cached when it finishes; if its
+        # encode failed they are still missing here and go into the next batch
+        while missing:
+            encoded = self._encode(missing)
+            still_missing = {}
+            for key, text in missing.items():
+                vector = encoded.get(key)
+                if vector is None:
+                    vector = self._lookup(key)
+                if vector is None:
+                    still_missing[key] = text
+                else:
+                    vectors[key] = vector
+            missing = still_missing
+
+        return [vectors[key] for key in keys]
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        with self._memory_lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self.stats["disk_hits"] += 1
+                self._remember({key: vector})
+                return vector
+        return None
+
+    def _remember(self, items: Dict[str, np.ndarray]):
+        with self._memory_lock:
+            for key, vector in items.items():
+                self._memory[key] = vector
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.cache_size:
+                self._memory.popitem(last=False)
+
+    def _encode(self, texts: Dict[str, str]) -> Dict[str, np.ndarray]:
+        with self._pending_lock:
+            for key, text in texts.items():
+                self._pending.setdefault(key, text)
+
+        # Whoever gets the model encodes everything queued by all callers. Texts taken
+        # by an earlier holder are stored before it releases the lock.
+        with self._encode_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+            with self._memory_lock:
+                batch = {k: t for k, t in batch.items() if k not in self._memory}
+            if not batch:
+                return {}
+
+            try:
+                matrix = self.model.encode(
+                    list(batch.values()),
+                    batch_size=self.batch_size,
+                    convert_to_numpy=True
+                ).astype(np.float32)
+            except Exception:
+                # Other callers' texts go back in the queue for the next holder; this
+                # caller gets the error
+                with self._pending_lock:
+                    for key, text in batch.items():
+                        if key not in texts:
+                            self._pending.setdefault(key, text)
+                raise
+            encoded = dict(zip(batch.keys(), matrix))
+            self.stats["encoded"] += len(encoded)
+            self.stats["batches"] += 1
+
+            self._remember(encoded)
+            if self.disk is not None:
+                self.disk.put_many(encoded)
+            return encoded
@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from agent.utils.config import config
+from agent.utils.logger import logger
+
+
+class BaseKVStore(ABC):
+    """Short-term context store: per-key TTL (seconds, None for no expiry)"""
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def clear(self, prefix: str = ""):
+        """Drop every key starting with prefix"""
+        pass
+
+    def namespace(self, name: str) -> "NamespacedKVStore":
+        """View whose keys live under name, e.g. one namespace per run"""
+        return NamespacedKVStore(self, name)
+
+
+class NamespacedKVStore(BaseKVStore):
+    def __init__(self, store: BaseKVStore, name: str):
+        self.store = store
+        self.prefix = f"{name}:"
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.store.get(self.prefix + key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.store.set(self.prefix + key, value, ttl)
+
+    def delete(self, key: str):
+        self.store.delete(self.prefix + key)
+
+    def clear(self, prefix: str = ""):
+        self.store.clear(self.prefix + prefix)
+
+    def namespace(self, name: str) -> "NamespacedKVStore":
+        return NamespacedKVStore(self.store, self.prefix + name)
+
+
+class InMemoryKVStore(BaseKVStore):
+    """
+    In-process store bounded to max_entries, evicting the least recently used key.
+    Expired keys are dropped when read, and swept before anything live is evicted.
+    """
+    def __init__(self, max_entries: int = 10000, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        # key -> (value, expires_at or None)
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_entries:
+                self._sweep()
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def _sweep(self):
+        now = time.monotonic()
+        expired = [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self.stats["expired"] += len(expired)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, prefix: str = ""):
+        with self._lock:
+            if not prefix:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisKVStore(BaseKVStore):
+    """
+    Redis-backed store, shared by every worker pointed at the same server.
+    Values are stored as JSON; TTLs map to PX expiry. Size bounds are the server's
+    job (maxmemory with an allkeys-lru policy).
+    Any client with the redis-py interface works, e.g. fakeredis in tests.
+    """
+    def __init__(self, client=None, url: str = "redis://localhost:6379/0", prefix: str = "agent:",
+                 default_ttl: Optional[float] = None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        px = max(1, int(ttl * 1000)) if ttl is not None else None
+        self.client.set(self.prefix + key, json.dumps(value, default=str), px=px)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self, prefix: str = ""):
+        batch = []
+        for key in self.client.scan_iter(match=self.prefix + prefix + "*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+
+def create_kv_store() -> BaseKVStore:
+    """Build the store selected by memory.kv in the config"""
+    backend = config.get("memory.kv.backend", "memory")
+    default_ttl = config.get("memory.kv.default_ttl")
+    if backend == "redis":
+        logger.info("Using Redis for short-term context")
+        return RedisKVStore(
+            url=config.get("memory.kv.url", "redis://localhost:6379/0"),
+            prefix=config.get("memory.kv.prefix", "agent:"),
+            default_ttl=default_ttl
+        )
+    return InMemoryKVStore(
+        max_entries=config.get("memory.kv.max_entries", 10000),
+        default_ttl=default_ttl
+    )
@@ -1,79 +1,281 @@
 import os
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
+import atexit
+import hashlib
+import json
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from agent.utils.config import config
+from agent.utils.logger import logger
+from agent.utils.tracing import tracer
+from agent.memory.embeddings import EmbeddingService
+from agent.memory.vector_store import BaseVectorStore, ChromaVectorStore, NumpyVectorStore
+from agent.memory.kv_store import BaseKVStore, create_kv_store
+from agent.memory.storage import BaseStorage, create_storage
+from agent.memory.retriever import Retriever
+
+
+@lru_cache(maxsize=None)
+def _cached_embedding_function_class():
+    """Defined on first use so that importing this module does not import chromadb"""
+    from chromadb.utils import embedding_functions
+
+    class CachedEmbeddingFunction(embedding_functions.SentenceTransformerEmbeddingFunction):
+        """
+        Chroma embedding function served by an EmbeddingService.
+        It keeps the sentence_transformer identity so existing collections open without
+        an embedding function conflict.
+        """
+        def __init__(self, service: EmbeddingService):
+            # The parent constructor would load a private copy of the model; the service owns it instead
+            self.service = service
+            self.model_name = service.model_name
+            self.device = service.device
+            self.normalize_embeddings = False
+            self.kwargs = {}
+
+        def __call__(self, input):
+            return self.service.embed(list(input))
+
+    return CachedEmbeddingFunction
+
+
+def CachedEmbeddingFunction(service: EmbeddingService):
+    return _cached_embedding_function_class()(service)
 
 class MemoryManager:
     def __init__(self, persist_directory: str = "agent_memory_db"):
         self.persist_directory = persist_directory
         
         # Initialize Embedding Function (using local SentenceTransformer)
-        # This ensures consistent and offline-capable embeddings
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
+        # This ensures consistent and offline-capable embeddings.
+        # One cached, batching service is shared by every collection.
+        disk_cache = config.get("memory.embedding.disk_cache", True)
+        self.embedder = EmbeddingService(
+            model_name=config.get("memory.embedding.model", "all-MiniLM-L6-v2"),
+            device=config.get("memory.embedding.device", "cpu"),
+            batch_size=config.get("memory.embedding.batch_size", 32),
+            cache_size=config.get("memory.embedding.cache_size", 10000),
+            cache_dir=os.path.join(persist_directory, "embedding_cache") if disk_cache else None
         )
+        self.embedding_fn = CachedEmbeddingFunction(self.embedder)
         
-        # Initialize ChromaDB Client
-        self.chroma_client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="agent_knowledge",
-            embedding_function=self.embedding_fn
-        )
-        self.tool_collection = self.chroma_client.get_or_create_collection(
-            name="agent_tools",
-            embedding_function=self.embedding_fn
-        ) # New collection for tools
+        # Vector store backend: "chroma" (default) or the in-process "numpy" store
+        self.backend = config.get("memory.backend", "chroma")
+        self.chroma_client = None
+        self.collection = self._open_store("agent_knowledge")
+        self.tool_collection = self._open_store("agent_tools") # New collection for tools
         
-        # Simple Key-Value Store (mocking Redis)
-        self.kv_store: Dict[str, Any] = {}
+        # Keyword-searchable copy of long-term memories (memory.storage.backend); queries
+        # fall back to it when vector search fails, e.g. the embedding model cannot load
+        self.storage: BaseStorage = create_storage(path=os.path.join(persist_directory, "log"))
+        self.retriever = Retriever(self.storage)
+
+        # Short-term context: in-process LRU/TTL store or Redis (memory.kv.backend)
+        self.kv_store: BaseKVStore = create_kv_store()
+
+        # Long-term writes are embedded and inserted in batches of this size
+        self.batch_size = config.get("memory.batch_size", 64)
+
+        # Optional write-behind buffer: add_memory only queues, and the queue is
+        # flushed as one batch once it is full or older than flush_interval
+        self.buffer_enabled = config.get("memory.write_buffer.enabled", False)
+        self.buffer_max_size = config.get("memory.write_buffer.max_size", 32)
+        self.buffer_flush_interval = config.get("memory.write_buffer.flush_interval", 2.0)
+        self._buffer: List[tuple] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        if self.buffer_enabled:
+            self._stop_flusher = threading.Event()
+            self._flusher = threading.Thread(target=self._flush_periodically, name="memory-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+
+    def _open_store(self, name: str) -> BaseVectorStore:
+        if self.backend == "numpy":
+            return NumpyVectorStore(
+                os.path.join(self.persist_directory, "numpy", name),
+                embedding_fn=self.embedding_fn,
+                hnsw_threshold=config.get("memory.numpy.hnsw_threshold", 50000)
+            )
 
+        # Initialize ChromaDB Client (shared by both collections)
+        if self.chroma_client is None:
+            import chromadb
+            self.chroma_client = chromadb.PersistentClient(path=self.persist_directory)
+        return ChromaVectorStore(self.chroma_client.get_or_create_collection(
+            name=name,
+            embedding_function=self.embedding_fn
+        ))
+
+    @staticmethod
+    def tool_hash(tool: Dict[str, Any]) -> str:
+        """Fingerprint of everything that affects a tool's index entry"""
+        payload = json.dumps(
+            [tool["name"], tool.get("description", ""), tool.get("schema")],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    def index_tool(self, tool_name: str, tool_description: str):
-        """Index a tool for retrieval"""
-        self.tool_collection.add(
+    def index_tool(self, tool_name: str, tool_description: str, schema: Optional[Dict[str, Any]] = None):
+        """Index a tool for retrieval (no-op if it is already indexed unchanged)"""
+        tool = {"name": tool_name, "description": tool_description, "schema": schema}
+        digest = self.tool_hash(tool)
+        existing = self.tool_collection.get(ids=[tool_name], include=["metadatas"])
+        if existing["ids"] and (existing["metadatas"][0] or {}).get("hash") == digest:
+            return
+        self.tool_collection.upsert(
             documents=[tool_description],
-            metadatas=[{"name": tool_name}],
+            metadatas=[{"name": tool_name, "hash": digest}],
             ids=[tool_name]
         )
 
+    def sync_tools(self, tools: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Make the tool index match tools ({"name", "description", "schema"} dicts).
+        Only new or changed tools are embedded, in one batched upsert, and tools
+        that are no longer present are deleted.
+        """
+        existing = self.tool_collection.get(include=["metadatas"])
+        indexed = {
+            tool_id: (metadata or {}).get("hash")
+            for tool_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
+
+        wanted = {t["name"]: t for t in tools}
+        changed = []
+        for name, tool in wanted.items():
+            digest = self.tool_hash(tool)
+            if indexed.get(name) != digest:
+                changed.append((tool, digest))
+        removed = [tool_id for tool_id in indexed if tool_id not in wanted]
+
+        if changed:
+            self.tool_collection.upsert(
+                documents=[t.get("description", "") for t, _ in changed],
+                metadatas=[{"name": t["name"], "hash": digest} for t, digest in changed],
+                ids=[t["name"] for t, _ in changed]
+            )
+        if removed:
+            self.tool_collection.delete(ids=removed)
+
+        logger.info(f"Tool index synced: {len(changed)} upserted, {len(removed)} removed, {len(wanted) - len(changed)} unchanged")
+        return {"upserted": len(changed), "removed": len(removed), "unchanged": len(wanted) - len(changed)}
+
     def retrieve_tools(self, query: str, limit: int = 5) -> List[str]:
         """Retrieve relevant tool names"""
-        results = self.tool_collection.query(
-            query_texts=[query],
-            n_results=limit
-        )
+        return [name for name, _ in self.retrieve_tools_scored(query, limit)]
+
+    def retrieve_tools_scored(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Retrieve relevant tool names with their distances (smaller is closer)"""
+        with tracer.span("retrieve_tools", kind="memory", limit=limit):
+            results = self.tool_collection.query(
+                query_texts=[query],
+                n_results=limit,
+                include=["metadatas", "distances"]
+            )
         if results['metadatas']:
-            return [m['name'] for m in results['metadatas'][0]]
+            return [(m['name'], d) for m, d in zip(results['metadatas'][0], results['distances'][0])]
         return []
 
-    def store_context(self, key: str, value: Any):
-        """Store short-term context (Redis-like)"""
-        self.kv_store[key] = value
+    def store_context(self, key: str, value: Any, ttl: Optional[float] = None, namespace: Optional[str] = None):
+        """Store short-term context, optionally expiring after ttl seconds and scoped to a namespace (e.g. a run id)"""
+        store = self.kv_store.namespace(namespace) if namespace else self.kv_store
+        store.set(key, value, ttl)
 
-    def retrieve_context(self, key: str) -> Optional[Any]:
+    def retrieve_context(self, key: str, namespace: Optional[str] = None) -> Optional[Any]:
         """Retrieve short-term context"""
-        return self.kv_store.get(key)
+        store = self.kv_store.namespace(namespace) if namespace else self.kv_store
+        return store.get(key)
+
+    def clear_context(self, namespace: Optional[str] = None):
+        """Drop all short-term context, or just one namespace"""
+        if namespace:
+            self.kv_store.namespace(namespace).clear()
+        else:
+            self.kv_store.clear()
 
-    def add_memory(self, content: str, metadata: Dict[str, Any] = None):
-        """Add long-term memory to Vector DB"""
-        metadata = metadata or {}
-        doc_id = str(len(self.collection.get()['ids']) + 1)
+    def add_memory(self, content: str, metadata: Dict[str, Any] = None) -> Optional[str]:
+        """Add long-term memory to Vector DB. Returns the id, or None if the write was buffered"""
+        if self.buffer_enabled:
+            with self._buffer_lock:
+                # The id is fixed now, so a retried flush cannot insert a memory twice
+                self._buffer.append((content, metadata, uuid.uuid4().hex))
+                is_full = len(self._buffer) >= self.buffer_max_size
+            if is_full:
+                self.flush()
+            return None
+        return self.add_memories([content], [metadata])[0]
+
+    def add_memories(self, contents: List[str], metadatas: List[Dict[str, Any]] = None,
+                     ids: Optional[List[str]] = None) -> List[str]:
+        """Add several memories, embedding and inserting them in batches"""
+        metadatas = metadatas or [None] * len(contents)
+        # Random ids need no lookup of existing ids and cannot collide across concurrent writers
+        ids = ids or [uuid.uuid4().hex for _ in contents]
         
-        # In a real app, we would use embeddings model to embed the content
-        # Chroma handles default embedding if none provided, but here we just pass content
-        self.collection.add(
-            documents=[content],
-            metadatas=[metadata],
-            ids=[doc_id]
-        )
+        with tracer.span("add_memories", kind="memory", count=len(contents)):
+            # Keyword copy first, so memories stay searchable even if embedding fails;
+            # a retried write replaces its items by id
+            for memory_id, content, metadata in zip(ids, contents, metadatas):
+                self.storage.add({"id": memory_id, "content": content, "metadata": metadata})
+            for start in range(0, len(contents), self.batch_size):
+                end = start + self.batch_size
+                self.collection.add(
+                    documents=contents[start:end],
+                    # Chroma rejects empty metadata dicts, None means "no metadata"
+                    metadatas=[m or None for m in metadatas[start:end]],
+                    ids=ids[start:end]
+                )
+        return ids
+
+    def flush(self):
+        """Write out any buffered memories"""
+        # Serialized so a timer flush and a size flush cannot interleave their batches
+        with self._flush_lock:
+            with self._buffer_lock:
+                pending, self._buffer = self._buffer, []
+            if not pending:
+                return
+            contents, metadatas, ids = zip(*pending)
+            try:
+                self.add_memories(list(contents), list(metadatas), list(ids))
+            except Exception as e:
+                # Back in front of anything buffered meanwhile; batches that did land are
+                # skipped on retry since adding an existing id is a no-op
+                with self._buffer_lock:
+                    self._buffer[:0] = pending
+                logger.error(f"Memory flush failed, {len(pending)} memories stay buffered: {e}")
+                raise
+            logger.debug(f"Flushed {len(pending)} buffered memories")
+
+    def _flush_periodically(self):
+        while not self._stop_flusher.wait(self.buffer_flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # logged by flush; the next tick retries
 
     def retrieve_relevant(self, query: str, limit: int = 5) -> List[str]:
         """Retrieve relevant memories from Vector DB"""
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=limit
-        )
+        # Read-your-writes: buffered memories must be visible to queries
+        if self.buffer_enabled:
+            try:
+                self.flush()
+            except Exception:
+                pass  # logged by flush; what reached the keyword storage is still found below
+        try:
+            with tracer.span("retrieve_relevant", kind="memory", limit=limit):
+                results = self.collection.query(
+                    query_texts=[query],
+                    n_results=limit
+                )
+        except Exception as e:
+            logger.warning(f"Vector search failed ({e}); falling back to keyword search")
+            return [item["content"] for item in self.retriever.retrieve(query, limit)]
         if results['documents']:
             return results['documents'][0]
         return []
@@ -6,12 +6,18 @@ class Retriever:
         self.storage = storage
 
     def retrieve(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        all_data = self.storage.get_all()
-        # Simple keyword matching for demonstration
+        # BM25 over the storage's inverted index, best match first
+        hits = self.storage.search(query, limit)
+        if hits is not None:
+            return [item for item, _ in hits]
+
+        # Storage without an index: simple keyword matching, streamed so the
+        # store is never loaded as a whole
         results = []
-        for item in all_data:
+        for item in self.storage.iter_all():
             content = str(item.get('content', '')).lower()
             if query.lower() in content:
                 results.append(item)
-        
-        return results[:limit]
+                if len(results) >= limit:
+                    break
+        return results
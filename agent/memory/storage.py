@@ -1,5 +1,15 @@
+import itertools
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from agent.utils.config import config
+from agent.utils.text_index import InvertedIndex
+from agent.utils.logger import logger
 
 class BaseStorage(ABC):
     @abstractmethod
@@ -10,12 +20,262 @@ class BaseStorage(ABC):
     def get_all(self) -> List[Dict[str, Any]]:
         pass
 
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Stream stored items; backends that can avoid building a list override this"""
+        yield from self.get_all()
+
+    def search(self, query: str, limit: int = 5) -> Optional[List[Tuple[Dict[str, Any], float]]]:
+        """Ranked keyword search, or None if this storage keeps no index"""
+        return None
+
 class InMemoryStorage(BaseStorage):
     def __init__(self):
         self.data = []
+        # Items' content is tokenized once here, keyed by position in self.data
+        self.index = InvertedIndex()
 
     def add(self, data: Dict[str, Any]):
         self.data.append(data)
+        self.index.add(len(self.data) - 1, str(data.get('content', '')))
 
     def get_all(self) -> List[Dict[str, Any]]:
         return self.data
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+        return [(self.data[i], score) for i, score in self.index.search(query, limit)]
+
+class LogStorage(BaseStorage):
+    """
+    Durable append-only storage.
+    Items are appended as checksummed JSON records to numbered segment files; a new
+    segment is started once the active one passes segment_size bytes. An in-memory
+    offset index, rebuilt from the record headers on open, maps every live item to
+    its (segment, offset), and reads go through a memory map of the segment.
+    Items with an "id" replace earlier items with the same id and delete() appends a
+    tombstone; compact() rewrites the sealed segments without the dead records.
+    Live items' content is kept in the same BM25 InvertedIndex as InMemoryStorage,
+    rebuilt on open, so search() never scans the log.
+    """
+    # payload length, crc32 of key + payload, kind, key length
+    HEADER = struct.Struct("<IIBH")
+    PUT, DELETE = 0, 1
+
+    def __init__(self, directory: str, segment_size: int = 16 * 1024 * 1024, fsync: bool = False):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        # key -> (segment, offset); items without an id get a process-local int key
+        self._index: Dict[Any, Tuple[int, int]] = {}
+        # Keyword index over live items' content, keyed like _index
+        self.index = InvertedIndex()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._auto_keys = itertools.count()
+        self._lock = threading.RLock()
+        self._file = None
+        self._load()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:08d}.log")
+
+    def _segments(self) -> List[int]:
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".log"))
+
+    # --- recovery ----------------------------------------------------------
+
+    def _load(self):
+        segments = self._segments()
+        for segment in segments:
+            end = self._replay(segment)
+            path = self._segment_path(segment)
+            if end < os.path.getsize(path):
+                # Torn or corrupt tail, normally the last append before a crash
+                logger.warning(f"Truncating {path} at byte {end}: incomplete record")
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+                self._unmap(segment)
+
+        self._active = segments[-1] if segments else 0
+        self._file = open(self._segment_path(self._active), 'ab')
+        for key, location in self._index.items():
+            self.index.add(key, str(self._read(*location).get('content', '')))
+
+    def _replay(self, segment: int) -> int:
+        """Index every record in segment; returns the offset just past the last valid one"""
+        view = self._view(segment)
+        if view is None:
+            return 0
+        offset = 0
+        while offset + self.HEADER.size <= len(view):
+            length, crc, kind, key_length = self.HEADER.unpack_from(view, offset)
+            body_start = offset + self.HEADER.size
+            end = body_start + key_length + length
+            if end > len(view) or zlib.crc32(view[body_start:end]) != crc:
+                break
+            key = view[body_start:body_start + key_length].decode("utf-8")
+            self._apply(key, kind, segment, offset)
+            offset = end
+        return offset
+
+    def _apply(self, key: str, kind: int, segment: int, offset: int) -> Any:
+        """Update the offset index for one record; returns the key it is indexed under"""
+        if not key:
+            key = next(self._auto_keys)
+            self._index[key] = (segment, offset)
+        elif kind == self.DELETE:
+            self._index.pop(key, None)
+        else:
+            # Re-insert so iteration order follows the latest write
+            self._index.pop(key, None)
+            self._index[key] = (segment, offset)
+        return key
+
+    # --- reads -------------------------------------------------------------
+
+    def _view(self, segment: int) -> Optional[mmap.mmap]:
+        view = self._maps.get(segment)
+        if view is None:
+            path = self._segment_path(segment)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                return None
+            with open(path, 'rb') as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = view
+        return view
+
+    def _unmap(self, segment: int):
+        view = self._maps.pop(segment, None)
+        if view is not None:
+            view.close()
+
+    def _read(self, segment: int, offset: int) -> Dict[str, Any]:
+        view = self._view(segment)
+        length, _, _, key_length = self.HEADER.unpack_from(view, offset)
+        start = offset + self.HEADER.size + key_length
+        return json.loads(view[start:start + length].decode("utf-8"))
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            location = self._index.get(item_id)
+            return self._read(*location) if location else None
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Yield live items one at a time, decoding each from the segment maps"""
+        with self._lock:
+            keys = list(self._index)
+        for key in keys:
+            with self._lock:
+                location = self._index.get(key)
+                if location is None:
+                    continue  # deleted while iterating
+                item = self._read(*location)
+            yield item
+
+    def get_all(self) -> List[Dict[str, Any]]:
+        return list(self.iter_all())
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+        results = []
+        for key, score in self.index.search(query, limit):
+            with self._lock:
+                location = self._index.get(key)
+                if location is None:
+                    continue  # deleted since the search
+                results.append((self._read(*location), score))
+        return results
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # --- writes ------------------------------------------------------------
+
+    def _append(self, key: str, kind: int, payload: bytes, content: str = ""):
+        key_bytes = key.encode("utf-8")
+        body = key_bytes + payload
+        record = self.HEADER.pack(len(payload), zlib.crc32(body), kind, len(key_bytes)) + body
+        with self._lock:
+            if self._file.tell() > 0 and self._file.tell() + len(record) > self.segment_size:
+                self._file.close()
+                self._active += 1
+                self._file = open(self._segment_path(self._active), 'ab')
+
+            offset = self._file.tell()
+            self._file.write(record)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            # The active segment grew past its current map
+            self._unmap(self._active)
+            key = self._apply(key, kind, self._active, offset)
+            if kind == self.DELETE:
+                self.index.remove(key)
+            else:
+                self.index.add(key, content)
+
+    def add(self, data: Dict[str, Any]):
+        item_id = data.get("id")
+        self._append(str(item_id) if item_id is not None else "", self.PUT,
+                     json.dumps(data, ensure_ascii=False).encode("utf-8"), str(data.get('content', '')))
+
+    def delete(self, item_id: str):
+        with self._lock:
+            if str(item_id) in self._index:
+                self._append(str(item_id), self.DELETE, b"")
+
+    def compact(self):
+        """
+        Rewrite every sealed segment with only its live records. Tombstones in sealed
+        segments can go too: whatever they deleted lives in the same or an older segment.
+        """
+        with self._lock:
+            for segment in self._segments():
+                if segment == self._active:
+                    continue
+                live = [(key, offset) for key, (seg, offset) in self._index.items() if seg == segment]
+                path = self._segment_path(segment)
+                if not live:
+                    self._unmap(segment)
+                    os.remove(path)
+                    continue
+
+                view = self._view(segment)
+                tmp_path = path + ".tmp"
+                moved = {}
+                with open(tmp_path, 'wb') as f:
+                    for key, offset in live:
+                        length, _, _, key_length = self.HEADER.unpack_from(view, offset)
+                        moved[key] = f.tell()
+                        f.write(view[offset:offset + self.HEADER.size + key_length + length])
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._unmap(segment)
+                os.replace(tmp_path, path)
+                for key, offset in moved.items():
+                    self._index[key] = (segment, offset)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for segment in list(self._maps):
+                self._unmap(segment)
+
+
+def create_storage(backend: Optional[str] = None, path: str = "agent_memory_db/log") -> BaseStorage:
+    """
+    Keyword-searchable item storage selected by memory.storage.backend:
+      "log"    - durable LogStorage segments under path
+      "memory" - InMemoryStorage, lost on exit
+    """
+    backend = backend or config.get("memory.storage.backend", "log")
+    if backend == "memory":
+        return InMemoryStorage()
+    if backend == "log":
+        return LogStorage(
+            path,
+            segment_size=int(config.get("memory.storage.segment_size_mb", 16) * 1024 * 1024),
+            fsync=config.get("memory.storage.fsync", False)
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,442 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from agent.utils.logger import logger
+
+# The subset of the Chroma collection API that MemoryManager relies on. Results use
+# Chroma's shapes: get() returns flat lists, query() one list per query.
+
+
+class BaseVectorStore(ABC):
+    @abstractmethod
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+            embeddings: Optional[List[Any]] = None):
+        pass
+
+    @abstractmethod
+    def upsert(self, ids: List[str], documents: List[str], metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+               embeddings: Optional[List[Any]] = None):
+        pass
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Optional[List[Any]] = None,
+              n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+
+class ChromaVectorStore(BaseVectorStore):
+    """Adapter over a Chroma collection"""
+    def __init__(self, collection):
+        self.collection = collection
+
+    def add(self, ids, documents, metadatas=None, embeddings=None):
+        self.collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None):
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def get(self, ids=None, where=None, include=None):
+        return self.collection.get(ids=ids, where=where, include=include or ["metadatas", "documents"])
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None, include=None):
+        return self.collection.query(
+            query_texts=query_texts,
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include or ["metadatas", "documents", "distances"]
+        )
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+def matches_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style metadata filter ($eq/$ne/$gt/$gte/$lt/$lte/$in/$nin/$and/$or)"""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, c) for c in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(metadata, c) for c in condition):
+                return False
+            continue
+
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(key)
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            elif value is None:
+                ok = False
+            elif op == "$gt":
+                ok = value > operand
+            elif op == "$gte":
+                ok = value >= operand
+            elif op == "$lt":
+                ok = value < operand
+            elif op == "$lte":
+                ok = value <= operand
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+            if not ok:
+                return False
+    return True
+
+
+class NumpyVectorStore(BaseVectorStore):
+    """
+    In-process vector store.
+    Normalized embeddings live in one contiguous float32 matrix, appended to
+    vectors.f32 and read back through a memory map; ids, documents and metadata are
+    replayed from the append-only records.jsonl log. Queries are a vectorized
+    brute-force top-k, switching to an HNSW graph (hnswlib, if installed) once the
+    store holds hnsw_threshold live entries and the query has no metadata filter.
+    Distances are cosine distances. The Chroma collections in MemoryManager use
+    Chroma's default l2 space instead, so scores are not comparable across backends;
+    callers only rank by them, and for unit-length embeddings (squared l2 = 2 x cosine
+    distance) the rankings agree.
+    """
+    def __init__(self, path: str, embedding_fn: Optional[Callable[[List[str]], List[Any]]] = None,
+                 hnsw_threshold: int = 50000, compact_ratio: float = 0.5):
+        self.path = path
+        self.embedding_fn = embedding_fn
+        self.hnsw_threshold = hnsw_threshold
+        self.compact_ratio = compact_ratio
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.records_path = os.path.join(path, "records.jsonl")
+        self.meta_path = os.path.join(path, "meta.json")
+        self.compact_marker = os.path.join(path, "compact.commit")
+
+        self.dim: Optional[int] = None
+        # Per row; None marks a deleted or overwritten row
+        self._ids: List[Optional[str]] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._row_of: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._hnsw = None
+        self._hnsw_rows = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    # --- persistence -------------------------------------------------------
+
+    def _load(self):
+        self._finish_compaction()
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.dim = json.load(f)["dim"]
+        records = []
+        if os.path.exists(self.records_path):
+            with open(self.records_path, 'r', encoding='utf-8') as f:
+                records = f.readlines()
+
+        for line in records:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn final line from a crash mid-append
+                break
+            if record["op"] == "add":
+                self._append_row(record["id"], record["document"], record.get("metadata"))
+            elif record["op"] == "delete":
+                self._kill(record["id"])
+
+        stored_rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if self.dim and os.path.exists(self.vectors_path) else 0
+        if stored_rows < len(self._ids):
+            # Rows whose vectors never reached disk are dropped
+            for row in range(stored_rows, len(self._ids)):
+                if self._ids[row] is not None:
+                    del self._row_of[self._ids[row]]
+            del self._ids[stored_rows:], self._documents[stored_rows:], self._metadatas[stored_rows:]
+        elif stored_rows > len(self._ids):
+            # Vectors of an add whose log records never landed; drop them so rows stay aligned
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(len(self._ids) * self.dim * 4)
+        self._remap()
+
+    def _remap(self):
+        rows = len(self._ids)
+        if rows and self.dim:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        else:
+            self._matrix = None
+
+    def _append_row(self, doc_id: str, document: str, metadata: Optional[Dict[str, Any]]):
+        self._kill(doc_id)
+        self._row_of[doc_id] = len(self._ids)
+        self._ids.append(doc_id)
+        self._documents.append(document)
+        self._metadatas.append(metadata)
+
+    def _kill(self, doc_id: str):
+        row = self._row_of.pop(doc_id, None)
+        if row is not None:
+            self._ids[row] = None
+            self._documents[row] = None
+            self._metadatas[row] = None
+            if self._hnsw is not None and row < self._hnsw_rows:
+                self._hnsw.mark_deleted(row)
+
+    def _write(self, ids, documents, metadatas, matrix: np.ndarray):
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+            with open(self.meta_path, 'w', encoding='utf-8') as f:
+                json.dump({"dim": self.dim}, f)
+        # Vectors first: on replay, log records without a vector row are discarded
+        with open(self.vectors_path, 'ab') as f:
+            f.write(matrix.tobytes())
+        with open(self.records_path, 'a', encoding='utf-8') as f:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                f.write(json.dumps({"op": "add", "id": doc_id, "document": document, "metadata": metadata}) + "\n")
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self._append_row(doc_id, document, metadata)
+        self._remap()
+
+    def compact(self):
+        """
+        Rewrite the files without deleted/overwritten rows. The compacted files are
+        written and fsynced beside the live ones, then a marker file commits the swap,
+        so a crash at any point leaves either the old store or the new one (_load
+        finishes a committed swap and discards an uncommitted one).
+        """
+        with self._lock:
+            live = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+            matrix = np.array(self._matrix[live]) if live else np.zeros((0, self.dim or 0), dtype=np.float32)
+            ids = [self._ids[r] for r in live]
+            documents = [self._documents[r] for r in live]
+            metadatas = [self._metadatas[r] for r in live]
+
+            with open(self.vectors_path + ".compact", 'wb') as f:
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.records_path + ".compact", 'w', encoding='utf-8') as f:
+                for doc_id, document, metadata in zip(ids, documents, metadatas):
+                    f.write(json.dumps({"op": "add", "id": doc_id, "document": document, "metadata": metadata}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.compact_marker, 'w') as f:
+                os.fsync(f.fileno())
+
+            self._matrix, self._hnsw, self._hnsw_rows = None, None, 0
+            self._finish_compaction()
+            self._ids, self._documents, self._metadatas = ids, documents, metadatas
+            self._row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+            self._remap()
+            logger.debug(f"Compacted vector store {self.path} to {len(ids)} rows")
+
+    def _finish_compaction(self):
+        """Complete a committed compaction swap, or drop the files of an uncommitted one"""
+        committed = os.path.exists(self.compact_marker)
+        for path in (self.vectors_path, self.records_path):
+            if os.path.exists(path + ".compact"):
+                if committed:
+                    os.replace(path + ".compact", path)
+                else:
+                    os.remove(path + ".compact")
+        if committed:
+            os.remove(self.compact_marker)
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - len(self._row_of)
+        if dead > 1000 and dead > self.compact_ratio * len(self._ids):
+            self.compact()
+
+    # --- writes ------------------------------------------------------------
+
+    def _embed(self, documents: List[str], embeddings: Optional[List[Any]]) -> np.ndarray:
+        if embeddings is None:
+            if self.embedding_fn is None:
+                raise ValueError("No embeddings given and the store has no embedding function")
+            embeddings = self.embedding_fn(documents)
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def add(self, ids, documents, metadatas=None, embeddings=None):
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            # Like Chroma, adding an existing id is a no-op
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in self._row_of]
+            if len(keep) < len(ids):
+                logger.warning(f"Ignoring {len(ids) - len(keep)} existing ids in add")
+        if not keep:
+            return
+        ids = [ids[i] for i in keep]
+        documents = [documents[i] for i in keep]
+        metadatas = [metadatas[i] for i in keep]
+        if embeddings is not None:
+            embeddings = [embeddings[i] for i in keep]
+        matrix = self._embed(documents, embeddings)
+        with self._lock:
+            self._write(ids, documents, metadatas, matrix)
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None):
+        metadatas = metadatas or [None] * len(ids)
+        matrix = self._embed(documents, embeddings)
+        with self._lock:
+            self._write(ids, documents, metadatas, matrix)
+            self._maybe_compact()
+
+    def delete(self, ids):
+        with self._lock:
+            ids = [doc_id for doc_id in ids if doc_id in self._row_of]
+            if not ids:
+                return
+            with open(self.records_path, 'a', encoding='utf-8') as f:
+                for doc_id in ids:
+                    f.write(json.dumps({"op": "delete", "id": doc_id}) + "\n")
+            for doc_id in ids:
+                self._kill(doc_id)
+            self._maybe_compact()
+
+    # --- reads -------------------------------------------------------------
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def get(self, ids=None, where=None, include=None):
+        include = include or ["metadatas", "documents"]
+        with self._lock:
+            if ids is None:
+                rows = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+            else:
+                rows = [self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of]
+            if where:
+                rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+            return self._result(rows, include)
+
+    def _result(self, rows: List[int], include: List[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"ids": [self._ids[r] for r in rows]}
+        result["documents"] = [self._documents[r] for r in rows] if "documents" in include else None
+        result["metadatas"] = [self._metadatas[r] for r in rows] if "metadatas" in include else None
+        result["embeddings"] = np.array(self._matrix[rows]) if "embeddings" in include and rows else None
+        return result
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None, include=None):
+        include = include or ["metadatas", "documents", "distances"]
+        if query_embeddings is None:
+            query_embeddings = self.embedding_fn(query_texts)
+        queries = self._embed([""] * len(query_embeddings), query_embeddings)
+
+        keys = ["ids", "documents", "metadatas", "distances"]
+        output: Dict[str, Any] = {key: [] for key in keys}
+        with self._lock:
+            if self._matrix is None or not self._row_of:
+                for key in keys:
+                    output[key] = [[] for _ in range(len(queries))]
+                return output
+
+            candidates = None
+            if where:
+                candidates = np.array(
+                    [row for row, doc_id in enumerate(self._ids) if doc_id is not None and matches_where(self._metadatas[row], where)],
+                    dtype=np.int64
+                )
+
+            for query in queries:
+                rows, similarities = self._top_k(query, n_results, candidates)
+                result = self._result(rows, include)
+                output["ids"].append(result["ids"])
+                output["documents"].append(result["documents"])
+                output["metadatas"].append(result["metadatas"])
+                output["distances"].append([float(1.0 - s) for s in similarities])
+
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                output[key] = None
+        return output
+
+    def _top_k(self, query: np.ndarray, k: int, candidates: Optional[np.ndarray]):
+        if candidates is None and len(self._row_of) >= self.hnsw_threshold:
+            index = self._hnsw_index()
+            if index is not None:
+                return self._top_k_hnsw(index, query, k)
+
+        if candidates is None:
+            similarities = self._matrix @ query
+            alive = np.fromiter((doc_id is not None for doc_id in self._ids), dtype=bool, count=len(self._ids))
+            similarities[~alive] = -np.inf
+            rows = np.arange(len(self._ids))
+        else:
+            if len(candidates) == 0:
+                return [], []
+            rows = candidates
+            similarities = self._matrix[rows] @ query
+
+        k = min(k, int(np.isfinite(similarities).sum()))
+        if k <= 0:
+            return [], []
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [int(rows[i]) for i in top], [float(similarities[i]) for i in top]
+
+    def _hnsw_index(self):
+        """Build or extend the HNSW graph over all rows; None if hnswlib is unavailable"""
+        try:
+            import hnswlib
+        except ImportError:
+            if self._hnsw is None and not getattr(self, "_hnsw_warned", False):
+                logger.warning("hnswlib is not installed; using brute-force search")
+                self._hnsw_warned = True
+            return None
+
+        rows = len(self._ids)
+        if self._hnsw is None:
+            self._hnsw = hnswlib.Index(space="ip", dim=self.dim)
+            self._hnsw.init_index(max_elements=max(rows * 2, 1024), ef_construction=200, M=16)
+            self._hnsw_rows = 0
+        if rows > self._hnsw_rows:
+            if rows > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(rows * 2)
+            new_rows = np.arange(self._hnsw_rows, rows)
+            self._hnsw.add_items(np.asarray(self._matrix[self._hnsw_rows:rows]), new_rows)
+            for row in new_rows:
+                if self._ids[row] is None:
+                    self._hnsw.mark_deleted(int(row))
+            self._hnsw_rows = rows
+        return self._hnsw
+
+    def _top_k_hnsw(self, index, query: np.ndarray, k: int):
+        k = min(k, len(self._row_of))
+        index.set_ef(max(200, k * 10))
+        labels, distances = index.knn_query(query, k=k)
+        # hnswlib's "ip" distance is 1 - dot product
+        return [int(r) for r in labels[0]], [float(1.0 - d) for d in distances[0]]
@@ -1,7 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 class BaseTool(ABC):
+    # Pure tools (same args -> same output, no side effects) may set cacheable so
+    # repeated calls are served from the tool result cache; cache_ttl in seconds,
+    # None for the configured default. LangChain tools declare the same via metadata.
+    cacheable: bool = False
+    cache_ttl: Optional[float] = None
+    # Seconds before a call is abandoned; None for tools.executor.default_timeout
+    timeout: Optional[float] = None
+
     def __init__(self, name: str, description: str):
         self.name = name
         self.description = description
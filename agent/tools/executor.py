@@ -0,0 +1,94 @@
+import asyncio
+import inspect
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional
+from agent.tools.base import BaseTool as AgentBaseTool
+from agent.tools.skill_loader import LazySkillTool
+from agent.utils.logger import logger
+from agent.utils.tracing import tracer
+
+
+class ToolTimeoutError(Exception):
+    pass
+
+
+class ToolExecutor:
+    """
+    Runs tool calls off the caller's thread, with a deadline per call.
+    Sync tools run on a bounded thread pool; async tools (LangChain coroutines or an
+    async arun) run on one background event loop. Each tool is dispatched once,
+    by type: LangChain tools through invoke/ainvoke, our BaseTool through run/arun.
+    On timeout async calls are cancelled; a sync call that already started cannot
+    be interrupted, so its thread finishes in the background and its result is dropped.
+    """
+    def __init__(self, max_workers: int = 8):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="tool-async", daemon=True).start()
+            return self._loop
+
+    @staticmethod
+    def _dispatch(tool) -> tuple:
+        """(is_async, fn(kwargs)) for the tool's type"""
+        if isinstance(tool, LazySkillTool):
+            tool = tool.resolve()
+
+        if isinstance(tool, AgentBaseTool):
+            arun = getattr(tool, "arun", None)
+            if arun is not None and inspect.iscoroutinefunction(arun):
+                return True, lambda kwargs: arun(**kwargs)
+            return False, lambda kwargs: tool.run(**kwargs)
+
+        from langchain_core.tools import BaseTool
+        if isinstance(tool, BaseTool):
+            # Prefer the coroutine when there is one: unlike a thread it can be cancelled
+            if getattr(tool, "coroutine", None) is not None:
+                return True, tool.ainvoke
+            return False, tool.invoke
+
+        raise TypeError(f"Unsupported tool type: {type(tool).__name__}")
+
+    def submit(self, tool, kwargs: Dict[str, Any]) -> Future:
+        is_async, fn = self._dispatch(tool)
+        # Pool threads and the loop thread do not see the caller's context, so the
+        # current span is handed over explicitly as the tool span's parent
+        parent = tracer.current()
+        if is_async:
+            async def traced_async():
+                with tracer.span(tool.name, kind="tool", parent=parent):
+                    return await fn(kwargs)
+            return asyncio.run_coroutine_threadsafe(traced_async(), self._event_loop())
+
+        def traced():
+            with tracer.span(tool.name, kind="tool", parent=parent):
+                return fn(kwargs)
+        return self.pool.submit(traced)
+
+    @staticmethod
+    def result(future: Future, name: str, timeout: Optional[float], limit: Optional[float] = None) -> Any:
+        """
+        Wait up to timeout seconds for a submitted call, cancelling it if it misses the
+        deadline. limit is the call's full time allowance, for the error message.
+        """
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            limit = limit if limit is not None else timeout
+            logger.warning(f"Tool {name} timed out after {limit}s")
+            raise ToolTimeoutError(f"Tool '{name}' timed out after {limit}s")
+
+    def run(self, tool, kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        return self.result(self.submit(tool, kwargs), tool.name, timeout)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
@@ -1,55 +1,125 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 from agent.tools.base import BaseTool
-from agent.tools.mcp_adapter import MCPAdapter
-from agent.tools.skill_loader import SkillLoader
+from agent.tools.mcp_adapter import MCPAdapter, MCPTool
+from agent.tools.skill_loader import SkillLoader, LazySkillTool
+from agent.tools.ranker import HybridToolRanker
+from agent.tools.executor import ToolExecutor
+from agent.memory.kv_store import InMemoryKVStore
 from agent.utils.config import config
 from agent.utils.logger import logger
+from agent.utils.tracing import tracer
+import json
 import os
+import threading
+import time
 
-from agent.memory.manager import MemoryManager
+if TYPE_CHECKING:
+    from agent.memory.manager import MemoryManager
 
 class ToolManager:
-    def __init__(self, memory_manager: MemoryManager = None):
+    def __init__(self, memory_manager: "MemoryManager" = None):
         self.tools: Dict[str, BaseTool] = {}
         self.mcp_adapter = MCPAdapter()
         self.skill_loader = SkillLoader(os.path.join(os.getcwd(), 'skills'))
         self.memory_manager = memory_manager
+        self.ranker = self._new_ranker()
+        # Serializes catalog changes (registration, MCP refreshes from the notification
+        # thread); readers never lock, they see either the old or the new catalog
+        self._lock = threading.Lock()
+        # Results of cacheable tools, keyed on (tool name, canonical args)
+        self.result_cache = InMemoryKVStore(
+            max_entries=config.get("tools.cache.max_entries", 512),
+            default_ttl=config.get("tools.cache.default_ttl", 300)
+        ) if config.get("tools.cache.enabled", True) else None
+        # Bounded pool every tool call runs on, with per-call timeouts
+        self.executor = ToolExecutor(max_workers=config.get("tools.executor.max_workers", 8))
         self._initialize_tools()
 
     def _initialize_tools(self):
-        # 1. Load MCP Tools
-        mcp_servers = config.get("mcp.servers", {})
-        for name, url in mcp_servers.items():
-            self.mcp_adapter.connect_server(name, url)
+        # 1. Load MCP Tools (all servers are discovered concurrently)
+        mcp_servers = config.get("mcp.servers", {}) or {}
+        for name, spec in mcp_servers.items():
+            self.mcp_adapter.connect_server(name, spec)
+        self.mcp_adapter.on_tools_changed = self._refresh_mcp_tools
         
         for tool in self.mcp_adapter.list_tools():
-            self.register_tool(tool)
+            self.register_tool(tool, index=False)
 
         # 2. Load Skills
         for tool in self.skill_loader.load_skills():
-            self.register_tool(tool)
+            self.register_tool(tool, index=False)
             
         logger.info(f"Total tools loaded: {len(self.tools)}")
 
-    def register_tool(self, tool: BaseTool):
-        self.tools[tool.name] = tool
+        # 3. Index the whole catalog in one incremental pass
         if self.memory_manager:
-            self.memory_manager.index_tool(tool.name, tool.description)
+            self.memory_manager.sync_tools([self._describe_tool(t) for t in self.tools.values()])
+
+    def _new_ranker(self) -> HybridToolRanker:
+        return HybridToolRanker(
+            self.memory_manager,
+            alpha=config.get("tools.retrieval.alpha", 0.5),
+            cache_size=config.get("tools.retrieval.cache_size", 256)
+        )
+
+    def _refresh_mcp_tools(self, server_name: str):
+        """Re-sync one server's tools after it reported a tool list change"""
+        try:
+            fresh = {t.name: t for t in self.mcp_adapter.list_server_tools(server_name)}
+        except Exception as e:
+            logger.warning(f"Could not refresh tools of MCP server {server_name}: {e}")
+            return
+        # Runs on the MCP notification thread while nodes may be ranking tools: build
+        # the new catalog and ranker aside, then swap both in at once
+        with self._lock:
+            tools = {
+                name: tool for name, tool in self.tools.items()
+                if not (isinstance(tool, MCPTool) and tool.server == server_name)
+            }
+            tools.update(fresh)
+            ranker = self._new_ranker()
+            for tool in tools.values():
+                ranker.add_tool(tool.name, tool.description)
+            self.tools, self.ranker = tools, ranker
+        if self.memory_manager:
+            self.memory_manager.sync_tools([self._describe_tool(t) for t in tools.values()])
+        logger.info(f"MCP server {server_name}: {len(fresh)} tools")
+
+    def register_tool(self, tool: BaseTool, index: bool = True):
+        with self._lock:
+            self.tools[tool.name] = tool
+            # The keyword index is in-process and cheap, so it is always kept current
+            self.ranker.add_tool(tool.name, tool.description)
+        if index and self.memory_manager:
+            described = self._describe_tool(tool)
+            self.memory_manager.index_tool(described["name"], described["description"], described["schema"])
         logger.debug(f"Registered tool: {tool.name}")
 
+    @staticmethod
+    def _describe_tool(tool) -> Dict[str, Any]:
+        # LangChain tools expose their argument schema as .args
+        schema = getattr(tool, "args", None)
+        return {
+            "name": tool.name,
+            "description": tool.description,
+            "schema": schema if isinstance(schema, dict) else None
+        }
+
     def get_tool(self, name: str) -> Optional[BaseTool]:
         return self.tools.get(name)
 
     def list_tools(self, query: str = None, limit: int = 5) -> List[Dict[str, str]]:
         # Modified to support retrieval
-        if query and self.memory_manager:
-            relevant_names = self.memory_manager.retrieve_tools(query, limit)
-            tools_to_return = [self.tools[name] for name in relevant_names if name in self.tools]
+        # One catalog snapshot, in case an MCP refresh swaps it mid-call
+        tools = self.tools
+        if query:
+            relevant_names = self.ranker.rank(query, limit)
+            tools_to_return = [tools[name] for name in relevant_names if name in tools]
             # Fallback if no relevant tools found or memory not ready
             if not tools_to_return:
-                 tools_to_return = list(self.tools.values())[:limit]
+                 tools_to_return = list(tools.values())[:limit]
         else:
-            tools_to_return = list(self.tools.values())
+            tools_to_return = list(tools.values())
 
         # Support LangChain Tools
         result = []
@@ -63,23 +133,85 @@ class ToolManager:
                 })
         return result
 
+    @staticmethod
+    def _cache_policy(tool) -> Optional[Dict[str, Any]]:
+        """{"ttl": seconds or None} if the tool declared itself cacheable, else None"""
+        if isinstance(tool, LazySkillTool):
+            # The declaration lives on the real tool; it is imported to run anyway
+            tool = tool.resolve()
+        metadata = getattr(tool, "metadata", None) or {}
+        if getattr(tool, "cacheable", False) or metadata.get("cacheable"):
+            return {"ttl": getattr(tool, "cache_ttl", None) or metadata.get("cache_ttl")}
+        return None
+
+    @staticmethod
+    def _cache_key(name: str, kwargs: Dict[str, Any]) -> str:
+        return f"{name}:{json.dumps(kwargs, sort_keys=True, separators=(',', ':'), default=str)}"
+
+    def _timeout(self, tool) -> Optional[float]:
+        """Per-tool override in config, then the tool's own declaration, then the default"""
+        overrides = config.get("tools.executor.timeouts", {}) or {}
+        if tool.name in overrides:
+            return overrides[tool.name]
+        if isinstance(tool, LazySkillTool):
+            tool = tool.resolve()
+        metadata = getattr(tool, "metadata", None) or {}
+        return getattr(tool, "timeout", None) or metadata.get("timeout") or config.get("tools.executor.default_timeout", 30)
+
     def execute_tool(self, name: str, **kwargs):
-        tool = self.get_tool(name)
-        if tool:
+        return self.execute_tools_batch([{"tool": name, "args": kwargs}])[0]
+
+    def execute_tools_batch(self, calls: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Run several independent tool calls ({"tool": name, "args": {...}}) concurrently.
+        Results come back in call order; failures and timeouts come back as "Error: ..." strings.
+        """
+        results: List[Any] = [None] * len(calls)
+        pending = []
+
+        for i, call in enumerate(calls):
+            name = call.get("tool")
+            kwargs = call.get("args") or {}
+            tool = self.get_tool(name)
+            if not tool:
+                results[i] = f"Tool {name} not found."
+                continue
+
+            policy = None
+            if self.result_cache is not None:
+                try:
+                    policy = self._cache_policy(tool)
+                except Exception as e:
+                    logger.debug(f"No cache policy for {name}: {e}")
+            key = self._cache_key(name, kwargs) if policy is not None else None
+            if key is not None:
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    logger.debug(f"Tool cache hit: {name}")
+                    with tracer.span(name, kind="tool", cached=True):
+                        results[i] = cached[0]
+                    continue
+
             try:
-                # LangChain tool support
-                if hasattr(tool, "run"):
-                    # For StructuredTool or BaseTool, .run expects tool_input or **kwargs
-                    # If it's a StructuredTool from function, it might expect specific args
-                    # Let's try passing kwargs directly
-                    return tool.run(tool_input=kwargs)
-                elif hasattr(tool, "run"): # Fallback for old style if any
-                     return tool.run(**kwargs)
+                future = self.executor.submit(tool, kwargs)
             except Exception as e:
-                # Try passing as dictionary if kwargs failed or try positional
-                try:
-                    return tool.run(kwargs)
-                except:
-                    logger.error(f"Error executing tool {name}: {e}")
-                    return f"Error: {str(e)}"
-        return f"Tool {name} not found."
+                logger.error(f"Error executing tool {name}: {e}")
+                results[i] = f"Error: {str(e)}"
+                continue
+            timeout = self._timeout(tool)
+            pending.append((i, name, future, time.monotonic() + timeout, timeout, key, policy))
+
+        # All calls are already running, so each waits only for what is left of its own deadline
+        for i, name, future, deadline, timeout, key, policy in pending:
+            try:
+                result = self.executor.result(future, name, max(0.0, deadline - time.monotonic()), limit=timeout)
+            except Exception as e:
+                logger.error(f"Error executing tool {name}: {e}")
+                results[i] = f"Error: {str(e)}"
+                continue
+            results[i] = result
+            # Errors are not cached, so a retry really runs the tool again
+            if key is not None and not (isinstance(result, str) and result.startswith("Error")):
+                self.result_cache.set(key, (result,), ttl=policy["ttl"])
+
+        return results
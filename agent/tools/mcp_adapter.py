@@ -1,30 +1,524 @@
-from typing import List, Dict, Any, Type
-from langchain_core.tools import BaseTool, Tool
-from pydantic import BaseModel, Field
+import atexit
+import itertools
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, Union
+from urllib.parse import urljoin
+from agent.tools.base import BaseTool as AgentBaseTool
+from agent.utils.config import config
+from agent.utils.logger import logger
+
+PROTOCOL_VERSION = "2025-03-26"
+CLIENT_INFO = {"name": "agent", "version": "0.1.0"}
+
+
+class MCPError(Exception):
+    """JSON-RPC error returned by an MCP server"""
+    def __init__(self, error: Dict[str, Any]):
+        super().__init__(f"{error.get('message', 'MCP error')} (code {error.get('code')})")
+        self.code = error.get("code")
+        self.data = error.get("data")
+
+
+def _iter_sse(lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+    """(event, data) pairs from the lines of a text/event-stream body"""
+    event, data = "message", []
+    for line in lines:
+        if line == "":
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+    if data:
+        yield event, "\n".join(data)
+
+
+class StdioTransport:
+    """Newline-delimited JSON-RPC over a child process's stdin/stdout"""
+    def __init__(self, command: List[str], env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None):
+        self.command = command
+        self.env = env
+        self.cwd = cwd
+        self.proc = None
+        self._write_lock = threading.Lock()
+
+    def start(self, on_message: Callable[[Any], None], on_close: Callable[[], None]):
+        env = dict(os.environ, **self.env) if self.env else None
+        self.proc = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            env=env, cwd=self.cwd, text=True, encoding="utf-8", bufsize=1
+        )
+
+        def read():
+            for line in self.proc.stdout:
+                if line.strip():
+                    try:
+                        on_message(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"MCP stdio: ignoring non-JSON line: {line[:100]}")
+            on_close()
+
+        threading.Thread(target=read, name="mcp-stdio-reader", daemon=True).start()
+
+    def send(self, message: Dict[str, Any]):
+        if self.proc is None or self.proc.poll() is not None:
+            raise ConnectionError("MCP server process is not running")
+        with self._write_lock:
+            self.proc.stdin.write(json.dumps(message) + "\n")
+            self.proc.stdin.flush()
+
+    def close(self):
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=2)
+            except Exception:
+                self.proc.kill()
+
+
+class StreamableHttpTransport:
+    """
+    MCP over HTTP (the "Streamable HTTP" transport). Every message is a POST on one
+    pooled keep-alive client; the reply is JSON or an SSE stream. Server-initiated
+    messages (e.g. list_changed) arrive on a GET stream, if the server offers one.
+    """
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 30):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.session_id: Optional[str] = None
+        self.protocol_version: Optional[str] = None
+        self.client = None
+        self._on_message = None
+        self._closed = threading.Event()
+
+    def start(self, on_message: Callable[[Any], None], on_close: Callable[[], None]):
+        import httpx
+        self.client = httpx.Client(
+            timeout=httpx.Timeout(self.timeout, connect=config.get("mcp.connect_timeout", 5)),
+            limits=httpx.Limits(max_connections=config.get("mcp.max_connections", 16))
+        )
+        self._on_message = on_message
+        self._on_close = on_close
+
+    def _headers(self, accept: str) -> Dict[str, str]:
+        headers = dict(self.headers, Accept=accept)
+        if self.session_id:
+            headers["Mcp-Session-Id"] = self.session_id
+        if self.protocol_version:
+            headers["MCP-Protocol-Version"] = self.protocol_version
+        return headers
+
+    def send(self, message: Dict[str, Any]):
+        import httpx
+        try:
+            with self.client.stream("POST", self.url, json=message,
+                                    headers=self._headers("application/json, text/event-stream")) as response:
+                if response.status_code == 404 and self.session_id:
+                    raise ConnectionError("MCP session expired")
+                response.raise_for_status()
+                if "mcp-session-id" in response.headers:
+                    self.session_id = response.headers["mcp-session-id"]
+                if response.status_code == 202:
+                    return
+
+                content_type = response.headers.get("content-type", "")
+                if content_type.startswith("text/event-stream"):
+                    for event, data in _iter_sse(response.iter_lines()):
+                        if event == "message":
+                            self._on_message(json.loads(data))
+                else:
+                    body = response.read()
+                    if body:
+                        self._on_message(json.loads(body))
+        except httpx.TransportError as e:
+            raise ConnectionError(f"MCP server unreachable: {e}") from e
+
+    def listen(self):
+        """Open the GET stream for server-initiated messages (optional for servers)"""
+        def read():
+            try:
+                with self.client.stream("GET", self.url, headers=self._headers("text/event-stream"),
+                                        timeout=None) as response:
+                    if response.status_code != 200:
+                        return  # 405: server does not push messages
+                    for event, data in _iter_sse(response.iter_lines()):
+                        if event == "message":
+                            self._on_message(json.loads(data))
+            except Exception as e:
+                if not self._closed.is_set():
+                    logger.debug(f"MCP notification stream closed: {e}")
+
+        threading.Thread(target=read, name="mcp-http-listener", daemon=True).start()
+
+    def close(self):
+        self._closed.set()
+        if self.client is None:
+            return
+        if self.session_id:
+            try:
+                self.client.delete(self.url, headers=self._headers("application/json"), timeout=2)
+            except Exception:
+                pass
+        self.client.close()
+
+
+class SseTransport:
+    """
+    The older HTTP+SSE transport: one long-lived GET stream carries every server
+    message, and client messages are POSTed to the endpoint it announces.
+    """
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 30):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.endpoint: Optional[str] = None
+        self.client = None
+        self._ready = threading.Event()
+        self._closed = threading.Event()
+
+    def start(self, on_message: Callable[[Any], None], on_close: Callable[[], None]):
+        import httpx
+        self.client = httpx.Client(timeout=httpx.Timeout(self.timeout, connect=config.get("mcp.connect_timeout", 5)))
+        error: List[Exception] = []
+
+        def read():
+            try:
+                with self.client.stream("GET", self.url, headers=dict(self.headers, Accept="text/event-stream"),
+                                        timeout=httpx.Timeout(self.timeout, read=None)) as response:
+                    response.raise_for_status()
+                    for event, data in _iter_sse(response.iter_lines()):
+                        if event == "endpoint":
+                            self.endpoint = urljoin(self.url, data)
+                            self._ready.set()
+                        elif event == "message":
+                            on_message(json.loads(data))
+            except Exception as e:
+                error.append(e)
+            finally:
+                self._ready.set()
+                if not self._closed.is_set():
+                    on_close()
+
+        threading.Thread(target=read, name="mcp-sse-reader", daemon=True).start()
+        self._ready.wait(self.timeout)
+        if self.endpoint is None:
+            raise ConnectionError(f"MCP SSE server did not announce an endpoint: {error[0] if error else 'timeout'}")
+
+    def send(self, message: Dict[str, Any]):
+        import httpx
+        try:
+            response = self.client.post(self.endpoint, json=message, headers=self.headers)
+            response.raise_for_status()
+        except httpx.TransportError as e:
+            raise ConnectionError(f"MCP server unreachable: {e}") from e
+
+    def close(self):
+        self._closed.set()
+        if self.client is not None:
+            self.client.close()
+
+
+Transport = Union[StdioTransport, StreamableHttpTransport, SseTransport]
+
+
+def make_transport(spec: Union[str, Dict[str, Any]]) -> Transport:
+    """
+    Build a transport from a mcp.servers entry:
+      "http://host/mcp"                          - Streamable HTTP
+      "http://host/sse"                          - HTTP+SSE
+      {"url": ..., "transport": "sse"|"http", "headers": {...}}
+      {"command": "python", "args": [...], "env": {...}, "cwd": ...}   - stdio
+    """
+    timeout = config.get("mcp.timeout", 30)
+    if isinstance(spec, str):
+        spec = {"url": spec}
+    if "command" in spec:
+        command = spec["command"]
+        command = command.split() if isinstance(command, str) else list(command)
+        return StdioTransport(command + list(spec.get("args", [])), env=spec.get("env"), cwd=spec.get("cwd"))
+    url = spec["url"]
+    kind = spec.get("transport") or ("sse" if url.rstrip("/").endswith("/sse") else "http")
+    if kind == "sse":
+        return SseTransport(url, headers=spec.get("headers"), timeout=timeout)
+    return StreamableHttpTransport(url, headers=spec.get("headers"), timeout=timeout)
+
+
+class MCPClient:
+    """
+    One persistent JSON-RPC session with an MCP server.
+    Requests are pipelined: callers on any thread send immediately and wait on their
+    own future, which the transport's reader resolves by request id, so many tool
+    calls share the session concurrently. tools/list is cached until the server
+    sends notifications/tools/list_changed. A dropped session is re-established by
+    the next request.
+    """
+    def __init__(self, name: str, spec: Union[str, Dict[str, Any]], timeout: float = 30,
+                 on_tools_changed: Optional[Callable[[str], None]] = None):
+        self.name = name
+        self.spec = spec
+        self.timeout = timeout
+        self.on_tools_changed = on_tools_changed
+        self.transport: Optional[Transport] = None
+        self.server_info: Dict[str, Any] = {}
+        self.capabilities: Dict[str, Any] = {}
+        self.connected = False
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._tools: Optional[List[Dict[str, Any]]] = None
+        self._tools_lock = threading.Lock()
+
+    # --- session -----------------------------------------------------------
+
+    def connect(self):
+        with self._connect_lock:
+            if self.connected:
+                return
+            if self.transport is not None:
+                # The dropped session's transport still holds its process or connection pool;
+                # requests still waiting on it fail now rather than at their timeout
+                self.transport.close()
+                self._on_close(self.transport)
+            transport = make_transport(self.spec)
+            self.transport = transport
+            transport.start(self._on_message, lambda: self._on_close(transport))
+            self.connected = True
+            try:
+                result = self._request("initialize", {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "capabilities": {},
+                    "clientInfo": CLIENT_INFO
+                }, self.timeout)
+            except Exception:
+                self.connected = False
+                self.transport.close()
+                raise
+            self.server_info = result.get("serverInfo", {})
+            self.capabilities = result.get("capabilities", {})
+            if isinstance(self.transport, StreamableHttpTransport):
+                self.transport.protocol_version = result.get("protocolVersion", PROTOCOL_VERSION)
+            self.notify("notifications/initialized")
+            if isinstance(self.transport, StreamableHttpTransport):
+                self.transport.listen()
+            logger.info(f"MCP server {self.name} connected ({self.server_info.get('name', 'unknown')})")
+
+    def _on_message(self, message: Any):
+        if isinstance(message, list):
+            for m in message:
+                self._on_message(m)
+            return
+        if "id" in message and ("result" in message or "error" in message):
+            with self._pending_lock:
+                future = self._pending.pop(message["id"], None)
+            if future is None or future.done():
+                return  # cancelled or timed out
+            if "error" in message:
+                future.set_exception(MCPError(message["error"]))
+            else:
+                future.set_result(message["result"])
+        elif "method" in message:
+            self._on_server_message(message)
+
+    def _on_server_message(self, message: Dict[str, Any]):
+        method = message["method"]
+        if "id" in message:
+            # Server-to-client request; answered off the reader thread
+            if method == "ping":
+                reply = {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+            else:
+                reply = {"jsonrpc": "2.0", "id": message["id"],
+                         "error": {"code": -32601, "message": f"Method not found: {method}"}}
+            threading.Thread(target=self._send_quietly, args=(reply,), daemon=True).start()
+        elif method == "notifications/tools/list_changed":
+            logger.info(f"MCP server {self.name}: tool list changed")
+            with self._tools_lock:
+                self._tools = None
+            if self.on_tools_changed:
+                # The callback lists tools again, which needs this reader thread free
+                threading.Thread(target=self.on_tools_changed, args=(self.name,), daemon=True).start()
+
+    def _on_close(self, transport: Transport):
+        if transport is not self.transport:
+            return  # a replaced session's reader ending late
+        self.connected = False
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"MCP server {self.name} closed the connection"))
+
+    def _send_quietly(self, message: Dict[str, Any]):
+        try:
+            self.transport.send(message)
+        except Exception as e:
+            logger.debug(f"MCP {self.name}: could not send {message.get('method', 'reply')}: {e}")
+
+    def _request(self, method: str, params: Optional[Dict[str, Any]], timeout: Optional[float]) -> Dict[str, Any]:
+        request_id = next(self._ids)
+        future: Future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = future
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        try:
+            self.transport.send(message)
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._send_quietly({"jsonrpc": "2.0", "method": "notifications/cancelled",
+                                "params": {"requestId": request_id, "reason": "timeout"}})
+            raise TimeoutError(f"MCP {self.name}: {method} timed out after {timeout}s")
+        except ConnectionError:
+            self.connected = False
+            raise
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+    def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        if not self.connected:
+            self.connect()
+        return self._request(method, params, timeout or self.timeout)
+
+    def notify(self, method: str, params: Optional[Dict[str, Any]] = None):
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        self.transport.send(message)
+
+    def close(self):
+        if self.transport is not None:
+            self.connected = False
+            self.transport.close()
+
+    # --- tools -------------------------------------------------------------
+
+    def list_tools(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        with self._tools_lock:
+            if self._tools is not None and not refresh:
+                return self._tools
+        tools, cursor = [], None
+        while True:
+            result = self.request("tools/list", {"cursor": cursor} if cursor else None)
+            tools.extend(result.get("tools", []))
+            cursor = result.get("nextCursor")
+            if not cursor:
+                break
+        with self._tools_lock:
+            self._tools = tools
+        return tools
+
+    def call_tool(self, name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self.request("tools/call", {"name": name, "arguments": arguments}, timeout)
+
+
+class MCPTool(AgentBaseTool):
+    """A tool of a connected MCP server; runs go through the server's shared session"""
+    def __init__(self, client: MCPClient, spec: Dict[str, Any], name: Optional[str] = None):
+        super().__init__(name or spec["name"], spec.get("description", ""))
+        self.client = client
+        self.server = client.name
+        # Name on the server, which differs when the local name was prefixed
+        self.remote_name = spec["name"]
+        self.input_schema = spec.get("inputSchema") or {}
+        self.args = self.input_schema.get("properties", {})
+
+    def run(self, **kwargs) -> Any:
+        result = self.client.call_tool(self.remote_name, kwargs)
+        parts = []
+        for item in result.get("content", []):
+            if item.get("type") == "text":
+                parts.append(item["text"])
+            else:
+                parts.append(json.dumps(item))
+        if not parts and "structuredContent" in result:
+            parts.append(json.dumps(result["structuredContent"]))
+        text = "\n".join(parts)
+        return f"Error: {text}" if result.get("isError") else text
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "args": self.args
+        }
+
 
 class MCPAdapter:
     def __init__(self):
         self.connected_servers = []
+        self.clients: Dict[str, MCPClient] = {}
+        # Called with the server name when a server's tool list changes
+        self.on_tools_changed: Optional[Callable[[str], None]] = None
+        self._local_names: Dict[Tuple[str, str], str] = {}
+        atexit.register(self.close)
+
+    def connect_server(self, server_name: str, server_spec: Union[str, Dict[str, Any]]):
+        """Register a server; sessions are opened by list_tools, all servers at once"""
+        self.connected_servers.append({"name": server_name, "spec": server_spec})
+        self.clients[server_name] = MCPClient(
+            server_name, server_spec,
+            timeout=config.get("mcp.timeout", 30),
+            on_tools_changed=self._tools_changed
+        )
 
-    def connect_server(self, server_name: str, server_url: str):
-        # In a real scenario, this connects to an MCP server via SSE or Stdio
-        self.connected_servers.append({"name": server_name, "url": server_url})
+    def _tools_changed(self, server_name: str):
+        if self.on_tools_changed:
+            self.on_tools_changed(server_name)
 
-    def list_tools(self) -> List[BaseTool]:
+    def list_server_tools(self, server_name: str) -> List[MCPTool]:
+        client = self.clients[server_name]
+        tools = []
+        for spec in client.list_tools():
+            key = (server_name, spec["name"])
+            if key not in self._local_names:
+                taken = set(self._local_names.values())
+                # Same tool name on two servers: the later one is prefixed with its server
+                self._local_names[key] = spec["name"] if spec["name"] not in taken else f"{server_name}_{spec['name']}"
+            tools.append(MCPTool(client, spec, name=self._local_names[key]))
+        return tools
+
+    def list_tools(self) -> List[Any]:
         """
-        Convert MCP tools to LangChain BaseTools.
-        For this mock, we return some dummy tools.
+        Connect to every server concurrently and return their tools as MCPTool.
+        Servers that cannot be reached are skipped with a warning.
         """
+        if not self.clients:
+            return []
+
+        def discover(server_name: str) -> bool:
+            client = self.clients[server_name]
+            try:
+                client.connect()
+                client.list_tools()
+                return True
+            except Exception as e:
+                logger.warning(f"MCP server {server_name} unavailable: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as executor:
+            available = dict(zip(self.clients, executor.map(discover, self.clients)))
+
+        # Wrapped from the cached lists in config order, so name prefixing does not depend on timing
         tools = []
-        for server in self.connected_servers:
-            # Mocking a tool from an MCP server
-            def search_func(query: str):
-                return f"Result from {server['name']} for query: {query}"
-            
-            tool = Tool(
-                name=f"{server['name']}_search",
-                func=search_func,
-                description=f"Search capability provided by {server['name']}"
-            )
-            tools.append(tool)
+        for server_name, ok in available.items():
+            if ok:
+                tools.extend(self.list_server_tools(server_name))
         return tools
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+from agent.utils.text_index import InvertedIndex
+from agent.utils.logger import logger
+
+if TYPE_CHECKING:
+    from agent.memory.manager import MemoryManager
+
+
+def _min_max(scores: Dict[str, float]) -> Dict[str, float]:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {name: 1.0 for name in scores}
+    return {name: (score - low) / (high - low) for name, score in scores.items()}
+
+
+class HybridToolRanker:
+    """
+    Ranks tools for a step by blending BM25 over tool names/descriptions with
+    vector similarity from the memory tool index.
+    score = alpha * vector + (1 - alpha) * bm25, each min-max normalized over the
+    candidates. Without a MemoryManager it degrades to BM25 alone.
+    """
+    def __init__(self, memory_manager: Optional["MemoryManager"] = None, alpha: float = 0.5, cache_size: int = 256):
+        self.memory_manager = memory_manager
+        self.alpha = alpha
+        self.cache_size = cache_size
+        self.index = InvertedIndex()
+        self._cache: "OrderedDict[Tuple[str, int], List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_tool(self, name: str, description: str):
+        # Names like filesystem_search contribute their words as terms
+        self.index.add(name, f"{name} {description}")
+        with self._lock:
+            # Rankings may change with the catalog
+            self._cache.clear()
+
+    def remove_tool(self, name: str):
+        self.index.remove(name)
+        with self._lock:
+            self._cache.clear()
+
+    def rank(self, query: str, limit: int = 5) -> List[str]:
+        key = (query, limit)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        # Over-fetch from both retrievers so the blend can reorder them
+        candidates = max(limit * 3, limit)
+        keyword_scores = dict(self.index.search(query, candidates))
+
+        vector_scores: Dict[str, float] = {}
+        if self.memory_manager:
+            try:
+                # Smaller distance is better, so negate before normalizing
+                vector_scores = {
+                    name: -distance
+                    for name, distance in self.memory_manager.retrieve_tools_scored(query, candidates)
+                }
+            except Exception as e:
+                logger.warning(f"Vector tool retrieval failed, using keywords only: {e}")
+
+        keyword_norm = _min_max(keyword_scores)
+        vector_norm = _min_max(vector_scores)
+        alpha = self.alpha if vector_norm else 0.0
+        combined = {
+            name: alpha * vector_norm.get(name, 0.0) + (1 - alpha) * keyword_norm.get(name, 0.0)
+            for name in set(keyword_norm) | set(vector_norm)
+        }
+        ranked = [name for name, _ in sorted(combined.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+
+        with self._lock:
+            self._cache[key] = ranked
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return ranked
@@ -1,46 +1,182 @@
 import os
+import hashlib
 import importlib.util
-from typing import List, Any
-from langchain_core.tools import BaseTool, StructuredTool
+import inspect
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Any, Dict, Optional
+from agent.tools.base import BaseTool as AgentBaseTool
+from agent.utils.logger import logger
+
+
+def _file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class LazySkillTool(AgentBaseTool):
+    """
+    Catalog entry for a skill whose module has not been imported yet.
+    Name, description and schema come from the manifest; the module is imported
+    on the first run and the call is delegated to the real tool.
+    """
+    def __init__(self, name: str, description: str, schema: Optional[Dict[str, Any]], file_path: str, loader: "SkillLoader"):
+        super().__init__(name, description)
+        self.args = schema or {}
+        self.file_path = file_path
+        self.loader = loader
+        self._tool = None
+
+    def resolve(self):
+        if self._tool is None:
+            for tool in self.loader.import_skill(self.file_path):
+                if tool.name == self.name:
+                    self._tool = tool
+                    break
+            else:
+                raise RuntimeError(f"Skill {self.file_path} no longer provides tool {self.name}")
+        return self._tool
+
+    def run(self, tool_input: Any = None, **kwargs) -> Any:
+        return self.resolve().run(tool_input=tool_input if tool_input is not None else kwargs)
+
 
 class SkillLoader:
-    def __init__(self, skills_dir: str):
+    def __init__(self, skills_dir: str, manifest_path: Optional[str] = None):
         self.skills_dir = skills_dir
+        # Like bytecode, the manifest is derived data and lives in __pycache__
+        self.manifest_path = manifest_path or os.path.join(skills_dir, "__pycache__", "skill_manifest.json")
+        self._modules: Dict[str, List[Any]] = {}
+        self._failed = set()
+        self._import_lock = threading.Lock()
 
-    def load_skills(self) -> List[BaseTool]:
+    def load_skills(self) -> List[Any]:
+        """
+        Return the tool catalog. Modules unchanged since the manifest was written
+        are served from it as LazySkillTool entries; new or changed modules are
+        imported (in parallel) and their entries refreshed.
+        """
         tools = []
         if not os.path.exists(self.skills_dir):
             return tools
 
-        for filename in os.listdir(self.skills_dir):
+        manifest = self._read_manifest()
+        new_manifest = {}
+        stale = []
+
+        for filename in sorted(os.listdir(self.skills_dir)):
             if filename.endswith(".py") and filename != "__init__.py":
-                module_name = filename[:-3]
                 file_path = os.path.join(self.skills_dir, filename)
-                
-                try:
-                    spec = importlib.util.spec_from_file_location(module_name, file_path)
-                    module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(module)
-                    
-                    # Expect the module to have a 'get_tools' function that returns list of LangChain Tools
-                    # OR a list of functions we can wrap
-                    if hasattr(module, "get_tools"):
-                        module_tools = module.get_tools()
-                        # If the skill returns our old BaseTool, we might need to adapt, 
-                        # but let's assume we update skills to return LangChain tools or compatible objects.
-                        # For now, let's wrap anything that looks like a function or object with .run
-                        
-                        for t in module_tools:
-                            if isinstance(t, BaseTool):
-                                tools.append(t)
-                            elif hasattr(t, 'run') and hasattr(t, 'name') and hasattr(t, 'description'):
-                                # Adapt old custom tool to LangChain Tool
-                                tools.append(StructuredTool.from_function(
-                                    func=t.run,
-                                    name=t.name,
-                                    description=t.description
-                                ))
-                except Exception as e:
-                    print(f"Failed to load skill {module_name}: {e}")
-        
+                stat = os.stat(file_path)
+                entry = manifest.get(filename)
+
+                if entry and (entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size):
+                    # Touched but possibly identical content (checkout, copy)
+                    digest = _file_hash(file_path)
+                    entry = dict(entry, mtime=stat.st_mtime, size=stat.st_size) if entry["hash"] == digest else None
+
+                if entry:
+                    new_manifest[filename] = entry
+                    for t in entry["tools"]:
+                        tools.append(LazySkillTool(t["name"], t["description"], t.get("schema"), file_path, self))
+                else:
+                    stale.append(filename)
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(8, len(stale))) as executor:
+                imported = list(executor.map(
+                    lambda name: self.import_skill(os.path.join(self.skills_dir, name)), stale
+                ))
+            for filename, module_tools in zip(stale, imported):
+                file_path = os.path.join(self.skills_dir, filename)
+                tools.extend(module_tools)
+                if file_path in self._failed:
+                    # Not cached, so the import is retried on the next start
+                    continue
+                stat = os.stat(file_path)
+                new_manifest[filename] = {
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "hash": _file_hash(file_path),
+                    "tools": [
+                        {
+                            "name": t.name,
+                            "description": t.description,
+                            "schema": t.args if isinstance(getattr(t, "args", None), dict) else None
+                        }
+                        for t in module_tools
+                    ]
+                }
+
+        if new_manifest != manifest:
+            self._write_manifest(new_manifest)
+
+        logger.debug(f"Skills: {len(new_manifest) - len(stale)} from manifest, {len(stale)} imported")
         return tools
+
+    def import_skill(self, file_path: str) -> List[Any]:
+        """Import one skill module (once per loader) and return its tools"""
+        if file_path in self._modules:
+            return self._modules[file_path]
+
+        from langchain_core.tools import BaseTool, StructuredTool
+
+        filename = os.path.basename(file_path)
+        module_name = filename[:-3]
+        tools = []
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, file_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+
+            # Expect the module to have a 'get_tools' function that returns list of LangChain Tools
+            # OR a list of functions we can wrap
+            if hasattr(module, "get_tools"):
+                module_tools = module.get_tools()
+                # If the skill returns our old BaseTool, we might need to adapt,
+                # but let's assume we update skills to return LangChain tools or compatible objects.
+                # For now, let's wrap anything that looks like a function or object with .run
+
+                for t in module_tools:
+                    if isinstance(t, BaseTool):
+                        tools.append(t)
+                    elif hasattr(t, 'run') and hasattr(t, 'name') and hasattr(t, 'description'):
+                        # Adapt old custom tool to LangChain Tool
+                        arun = getattr(t, "arun", None)
+                        tools.append(StructuredTool.from_function(
+                            func=t.run,
+                            coroutine=arun if inspect.iscoroutinefunction(arun) else None,
+                            name=t.name,
+                            description=t.description,
+                            # Keep the tool's cache and timeout declarations through the wrapper
+                            metadata={
+                                "cacheable": getattr(t, "cacheable", False),
+                                "cache_ttl": getattr(t, "cache_ttl", None),
+                                "timeout": getattr(t, "timeout", None)
+                            }
+                        ))
+        except Exception as e:
+            print(f"Failed to load skill {module_name}: {e}")
+            self._failed.add(file_path)
+
+        with self._import_lock:
+            # Keep the first import if two threads raced on the same module
+            return self._modules.setdefault(file_path, tools)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            logger.warning(f"Could not write skill manifest: {e}")
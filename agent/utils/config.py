@@ -1,17 +1,16 @@
-import yaml
 import os
 
 class Config:
     _instance = None
-    _config = {}
+    _config = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Config, cls).__new__(cls)
-            cls._instance._load_config()
         return cls._instance
 
     def _load_config(self):
+        import yaml
         config_path = os.path.join(os.getcwd(), 'configs', 'config.yaml')
         if os.path.exists(config_path):
             with open(config_path, 'r', encoding='utf-8') as f:
@@ -21,6 +20,9 @@ class Config:
             self._config = {}
 
     def get(self, key, default=None):
+        # Read on first access rather than at import time
+        if self._config is None:
+            self._load_config()
         keys = key.split('.')
         value = self._config
         for k in keys:
@@ -30,4 +32,16 @@ class Config:
                 return default
         return value if value is not None else default
 
+    def set(self, key, value):
+        # Runtime override (benchmarks, scripts); not written back to the file
+        if self._config is None:
+            self._load_config()
+        keys = key.split('.')
+        node = self._config
+        for k in keys[:-1]:
+            if not isinstance(node.get(k), dict):
+                node[k] = {}
+            node = node[k]
+        node[keys[-1]] = value
+
 config = Config()
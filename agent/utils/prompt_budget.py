@@ -0,0 +1,160 @@
+import json
+import threading
+from typing import Any, Dict, List, Optional
+from agent.utils.config import config
+from agent.utils.logger import logger
+from agent.utils.tokens import count_tokens
+
+# node -> {"calls", "total", "max", "trimmed", "sections": {name: tokens}}
+prompt_stats: Dict[str, Dict[str, Any]] = {}
+_stats_lock = threading.Lock()
+
+
+def context_budget(model: Optional[str] = None) -> int:
+    """Prompt tokens available for model: its context window minus the completion reserve"""
+    model = model or config.get("llm.model", "")
+    windows = config.get("llm.prompt.model_context_windows", {}) or {}
+    window = windows.get(model, config.get("llm.prompt.context_window", 8192))
+    return window - config.get("llm.prompt.completion_reserve", 1024)
+
+
+def truncate_tokens(text: str, max_tokens: Optional[int], model: Optional[str] = None) -> str:
+    """Cut text to roughly max_tokens, marking the cut"""
+    if not max_tokens:
+        return text
+    tokens = count_tokens(text, model)
+    if tokens <= max_tokens:
+        return text
+    # Cut by the chars-per-token ratio, then back off until the marked cut fits
+    keep = int(len(text) * max_tokens / tokens)
+    while True:
+        cut = text[:keep] + "...[truncated]"
+        if keep == 0 or count_tokens(cut, model) <= max_tokens:
+            return cut
+        keep = int(keep * 0.9)
+
+
+def _strip_titles(value: Any, in_properties: bool = False) -> Any:
+    if isinstance(value, dict):
+        # Under "properties" the keys are argument names, so a "title" there is real
+        return {
+            k: _strip_titles(v, in_properties=(k == "properties" and not in_properties))
+            for k, v in value.items()
+            if in_properties or k != "title"
+        }
+    if isinstance(value, list):
+        return [_strip_titles(v) for v in value]
+    return value
+
+
+def compact_json(value: Any) -> str:
+    """Single-line JSON without the schema "title" noise pydantic adds"""
+    return json.dumps(_strip_titles(value), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class PromptSection:
+    """
+    A variable part of a prompt made of items (tools, history steps, plan lines).
+    When it does not fit, items are first capped at max_item_tokens, then dropped
+    starting with the least important: keep="head" keeps the first items (ranked
+    lists), "tail" the last ones (history), and anchor keeps those nearest to one
+    index (the current plan step). Kept items stay in their original order.
+    """
+    def __init__(self, name: str, items: List[str], priority: int = 0, keep: str = "head",
+                 anchor: Optional[int] = None, max_item_tokens: Optional[int] = None,
+                 max_tokens: Optional[int] = None, joiner: str = "\n", empty: str = "None"):
+        self.name = name
+        self.items = items
+        self.priority = priority
+        self.keep = keep
+        self.anchor = anchor
+        self.max_item_tokens = max_item_tokens
+        self.max_tokens = max_tokens
+        self.joiner = joiner
+        self.empty = empty
+        # Items left out by the last fit()
+        self.omitted = 0
+
+    def _order(self) -> List[int]:
+        n = len(self.items)
+        if self.anchor is not None:
+            return sorted(range(n), key=lambda i: (abs(i - self.anchor), i))
+        if self.keep == "tail":
+            return list(range(n - 1, -1, -1))
+        return list(range(n))
+
+    def fit(self, limit: int, model: Optional[str] = None) -> str:
+        self.omitted = 0
+        if not self.items:
+            return self.empty
+        if self.max_tokens is not None:
+            limit = min(limit, self.max_tokens)
+
+        items = [truncate_tokens(item, self.max_item_tokens, model) for item in self.items]
+        costs = [count_tokens(item, model) + 1 for item in items]
+        if sum(costs) <= limit:
+            return self.joiner.join(items)
+
+        # Leave room for the omission note
+        limit -= 10
+        kept = []
+        total = 0
+        for i in self._order():
+            if total + costs[i] > limit:
+                break
+            kept.append(i)
+            total += costs[i]
+        self.omitted = omitted = len(items) - len(kept)
+        text = self.joiner.join(items[i] for i in sorted(kept))
+        note = f"({omitted} {self.name} item{'s' if omitted != 1 else ''} omitted)"
+        return f"{text}{self.joiner}{note}" if text else note
+
+
+def build_prompt(node: str, template: str, fixed: Dict[str, Any], sections: List[PromptSection] = (),
+                 budget: Optional[int] = None, model: Optional[str] = None) -> str:
+    """
+    Format template within the context budget of model (default llm.model), counting
+    with its tokenizer. fixed values are used as is; sections are granted the remaining
+    tokens in priority order (lower first), each shrinking itself to what is left.
+    Token counts are recorded per node.
+    """
+    budget = budget or context_budget(model)
+    skeleton = template.format(**fixed, **{s.name: "" for s in sections})
+    fixed_tokens = count_tokens(skeleton, model)
+    available = budget - fixed_tokens
+
+    rendered = {}
+    section_tokens = {}
+    trimmed = False
+    for section in sorted(sections, key=lambda s: s.priority):
+        text = section.fit(max(0, available), model)
+        tokens = count_tokens(text, model)
+        rendered[section.name] = text
+        section_tokens[section.name] = tokens
+        trimmed = trimmed or section.omitted > 0
+        available -= tokens
+
+    prompt = template.format(**fixed, **rendered)
+    total = count_tokens(prompt, model)
+    if total > budget:
+        logger.warning(f"Prompt for {node} is {total} tokens, over the {budget} token budget")
+    logger.debug(f"Prompt tokens [{node}]: {total} " + " ".join(f"{k}={v}" for k, v in section_tokens.items()))
+
+    with _stats_lock:
+        stats = prompt_stats.setdefault(node, {"calls": 0, "total": 0, "max": 0, "trimmed": 0, "sections": {}})
+        stats["calls"] += 1
+        stats["total"] += total
+        stats["max"] = max(stats["max"], total)
+        stats["trimmed"] += int(trimmed)
+        for name, tokens in section_tokens.items():
+            stats["sections"][name] = stats["sections"].get(name, 0) + tokens
+    return prompt
+
+
+def format_prompt_stats() -> str:
+    lines = [f"{'node':<12}{'prompts':>8}{'mean':>8}{'max':>8}{'trimmed':>9}  sections (mean tokens)"]
+    with _stats_lock:
+        for node, s in prompt_stats.items():
+            sections = ", ".join(f"{k} {v // s['calls']}" for k, v in s["sections"].items())
+            lines.append(f"{node:<12}{s['calls']:>8}{s['total'] // s['calls']:>8}{s['max']:>8}{s['trimmed']:>9}  {sections}")
+    return "\n".join(lines)
@@ -0,0 +1,106 @@
+import heapq
+import math
+import re
+import threading
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric terms; underscores and punctuation split words"""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class InvertedIndex:
+    """
+    Incrementally maintained inverted index with BM25 ranking.
+    Documents are tokenized once when added; queries only touch the posting
+    lists of their own terms.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.doc_lengths: Dict[Hashable, int] = {}
+        # doc_id -> its distinct terms, so removal only touches its own postings
+        self.doc_terms: Dict[Hashable, List[str]] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: Hashable, text: str):
+        terms = tokenize(text)
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self._remove(doc_id)
+            counts: Dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self.doc_lengths[doc_id] = len(terms)
+            self.doc_terms[doc_id] = list(counts)
+            self.total_length += len(terms)
+
+    def remove(self, doc_id: Hashable):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: Hashable):
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.doc_terms.pop(doc_id, []):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Hashable, float]]:
+        """
+        Top-limit (doc_id, score) pairs by BM25, best first.
+        Terms are scored rarest first; once the k-th best score beats the most any
+        unseen document could still collect from the remaining terms, no new
+        candidates are admitted (MaxScore-style early termination).
+        """
+        with self._lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0 or limit <= 0:
+                return []
+            avg_length = self.total_length / n_docs or 1.0
+
+            terms = []
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if docs:
+                    idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                    # BM25's term contribution is bounded by idf * (k1 + 1)
+                    terms.append((idf * (self.k1 + 1), idf, docs))
+            terms.sort(key=lambda t: t[0], reverse=True)
+
+            remaining_bound = sum(t[0] for t in terms)
+            scores: Dict[Hashable, float] = {}
+            admitting = True
+            for upper_bound, idf, docs in terms:
+                remaining_bound -= upper_bound
+                for doc_id, tf in docs.items():
+                    if not admitting and doc_id not in scores:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                if admitting and len(scores) >= limit:
+                    kth_best = heapq.nlargest(limit, scores.values())[-1]
+                    if kth_best >= remaining_bound:
+                        admitting = False
+
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def add_many(self, items: Iterable[Tuple[Hashable, str]]):
+        for doc_id, text in items:
+            self.add(doc_id, text)
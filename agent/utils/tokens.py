@@ -0,0 +1,50 @@
+import math
+import os
+from functools import lru_cache
+from typing import Optional
+from agent.utils.config import config
+from agent.utils.logger import logger
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """tiktoken encoding for model, or None if tiktoken is off, missing or cannot load"""
+    if config.get("llm.prompt.tokenizer", "tiktoken") != "tiktoken":
+        return None
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed; token budgets use the ~4 chars/token estimate")
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        # Local / non-OpenAI models: cl100k is a close enough approximation
+        name = "cl100k_base"
+    return _load_encoding(name)
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    import tiktoken
+    # Encoding files are downloaded on first use and cached in TIKTOKEN_CACHE_DIR (a
+    # temp dir by default); a stable cache keeps working offline once the file is
+    # there, or after copying it in by hand
+    cache_dir = config.get("llm.prompt.tiktoken_cache_dir", None)
+    if cache_dir:
+        os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.expanduser(cache_dir))
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding {name} unavailable ({e}); token budgets use the ~4 chars/token estimate")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count of text, using tiktoken when available and ~4 chars per token otherwise"""
+    if not text:
+        return 0
+    encoding = _encoding(model or config.get("llm.model", "gpt-4"))
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
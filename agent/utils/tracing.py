@@ -0,0 +1,261 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from agent.utils.config import config
+from agent.utils.logger import logger
+
+# Span kinds used across the agent: run, node, llm, tool, memory
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "_start")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self._start = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9 if self.end_ns else time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    """Stand-in when tracing is off, so call sites need no checks"""
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlExporter:
+    """One span per line, appended as spans end"""
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def shutdown(self):
+        pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter:
+    """
+    OTLP/HTTP JSON exporter. Spans are queued and posted in batches to
+    <endpoint>/v1/traces from a background thread, so exporting never blocks a run.
+    """
+    def __init__(self, endpoint: str, service_name: str = "agent", batch_size: int = 256, interval: float = 2.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: List[Span] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]):
+        with self._lock:
+            self._queue.extend(spans)
+            if len(self._queue) >= self.batch_size:
+                self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            spans, self._queue = self._queue, []
+        if not spans:
+            return
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "agent"}, "spans": [self._encode(s) for s in spans]}]
+        }]}
+        try:
+            import httpx
+            httpx.post(self.url, json=payload, timeout=5).raise_for_status()
+        except Exception as e:
+            logger.warning(f"OTLP export of {len(spans)} spans failed: {e}")
+
+    @staticmethod
+    def _encode(span: Span) -> Dict[str, Any]:
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            # SPAN_KIND_INTERNAL; our own kind travels as an attribute
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in dict(span.attributes, **{"agent.kind": span.kind}).items()],
+            "status": {"code": 1 if span.status == "ok" else 2}
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._flush()
+
+
+class Tracer:
+    """
+    Collects spans for runs, graph nodes, LLM calls, tool calls and memory queries.
+    Off unless configured (tracing.enabled) or profiling; when off, span() costs a
+    flag check. Ended spans go to the exporters and, when profiling, are kept for
+    summary().
+    """
+    def __init__(self):
+        self.enabled = False
+        self.profile = False
+        self.exporters: List[Any] = []
+        self.finished: List[Span] = []
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None, profile: bool = False):
+        """Set up exporters from the tracing section of the config"""
+        self.shutdown()
+        enabled = config.get("tracing.enabled", False) if enabled is None else enabled
+        self.profile = profile
+        self.exporters = []
+        if enabled:
+            for name in config.get("tracing.exporters", ["jsonl"]) or []:
+                if name == "jsonl":
+                    self.exporters.append(JsonlExporter(config.get("tracing.jsonl_path", "traces/spans.jsonl")))
+                elif name == "otlp":
+                    self.exporters.append(OtlpExporter(
+                        config.get("tracing.otlp_endpoint", "http://localhost:4318"),
+                        service_name=config.get("tracing.service_name", "agent")
+                    ))
+                else:
+                    logger.warning(f"Unknown trace exporter: {name}")
+        self.enabled = bool(self.exporters) or profile
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", parent: Optional[Span] = None, **attributes) -> Iterator[Any]:
+        """
+        Time the enclosed block as a child of parent (default: the current span of
+        this context). Worker threads do not inherit the context, so code handing
+        work to a pool passes parent explicitly or runs it in a copied context.
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = Span(name, kind, parent or _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes.setdefault("error", str(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            self._end(span)
+
+    def _end(self, span: Span):
+        span.end_ns = span.start_ns + int((time.perf_counter() - span._start) * 1e9)
+        for exporter in self.exporters:
+            try:
+                exporter.export([span])
+            except Exception as e:
+                logger.warning(f"Span export failed: {e}")
+        if self.profile:
+            with self._lock:
+                self.finished.append(span)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per (kind, name): calls, total/mean/p95 seconds, errors and token sums"""
+        from agent.core.batch import percentile
+        groups: Dict[str, List[Span]] = {}
+        with self._lock:
+            for span in self.finished:
+                groups.setdefault(f"{span.kind}:{span.name}", []).append(span)
+
+        result = {}
+        for key, spans in groups.items():
+            durations = [s.duration for s in spans]
+            result[key] = {
+                "calls": len(spans),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "p95": percentile(durations, 95),
+                "errors": sum(1 for s in spans if s.status != "ok"),
+                "prompt_tokens": sum(s.attributes.get("prompt_tokens", 0) or 0 for s in spans),
+                "completion_tokens": sum(s.attributes.get("completion_tokens", 0) or 0 for s in spans)
+            }
+        return result
+
+    def format_summary(self) -> str:
+        rows = sorted(self.summary().items(), key=lambda item: -item[1]["total"])
+        lines = [f"{'span':<32}{'calls':>7}{'total(s)':>10}{'mean(ms)':>10}{'p95(ms)':>10}{'errors':>8}{'tokens in/out':>16}"]
+        for key, s in rows:
+            tokens = f"{s['prompt_tokens']}/{s['completion_tokens']}" if s["prompt_tokens"] or s["completion_tokens"] else ""
+            lines.append(f"{key[:31]:<32}{s['calls']:>7}{s['total']:>10.2f}{s['mean'] * 1000:>10.1f}"
+                         f"{s['p95'] * 1000:>10.1f}{s['errors']:>8}{tokens:>16}")
+        return "\n".join(lines)
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+tracer = Tracer()
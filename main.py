@@ -6,48 +6,156 @@ import os
 sys.path.append(os.getcwd())
 
 from agent.core.graph import build_graph
+from agent.core.state import make_initial_state
+from agent.core.checkpoint import new_run_id, run_config
+from agent.llm.router import LLMUnavailableError
 from agent.utils.logger import logger
+from agent.utils.tracing import tracer
 
-def main():
-    parser = argparse.ArgumentParser(description="Agent CLI (LangGraph)")
-    parser.add_argument("--task", type=str, help="The task for the agent to perform")
+def stream_graph(app, initial_state, run_cfg=None):
+    """Run the graph via app.stream, printing LLM deltas as they arrive"""
+    final_state = dict(initial_state or {})
+    current_source = None
     
-    args = parser.parse_args()
+    # "values" is the full state after each step, reducers applied (past_steps accumulates)
+    for mode, chunk in app.stream(initial_state, run_cfg, stream_mode=["custom", "updates", "values"]):
+        if mode == "custom":
+            source = (chunk.get("node"), chunk.get("step"))
+            if source != current_source:
+                label = chunk["node"] if chunk.get("step") is None else f"{chunk['node']} step {chunk['step'] + 1}"
+                print(f"\n[{label}] ", end="")
+                current_source = source
+            print(chunk.get("delta", ""), end="", flush=True)
+        elif mode == "values":
+            final_state = chunk
+        else:
+            # updates: {node_name: state_update}; a node finished, end its output line
+            current_source = None
+            print()
+    
+    return final_state
+
+def run_batch(args):
+    from agent.core.batch import BatchRunner, load_tasks, format_report
     
-    task = args.task or "Calculate 10 + 5 and summarize."
+    tasks = load_tasks(args.input)
+    print(f"Running {len(tasks)} tasks from {args.input} with {args.workers} {args.executor} workers")
     
-    print(f"Starting Agent with LangGraph Workflow for task: {task}")
+    # Threads share one compiled graph; process workers build their own once at start-up
+    app = build_graph() if args.executor == "thread" else None
+    runner = BatchRunner(app, workers=args.workers, executor=args.executor)
+    stats = runner.run(tasks, args.output)
     
+    print("\n--- Batch Report ---\n")
+    print(format_report(stats))
+    
+    from agent.llm.client import format_structured_stats
+    print("\n--- Structured Output ---\n")
+    print(format_structured_stats())
+    print(f"\nResults written to {args.output}")
+
+def run_single(args):
     # Build the graph
-    app = build_graph()
-    
-    # Initialize State
-    initial_state = {
-        "input": task,
-        "plan": [],
-        "current_step_index": 0,
-        "past_steps": [],
-        "response": None,
-        "scratchpad": {}
-    }
+    app = build_graph(stream=args.stream, memory=False if args.no_memory else None)
+    
+    if args.resume:
+        run_id = args.resume
+        run_cfg = run_config(run_id)
+        if app.checkpointer is None:
+            print("Checkpointing is disabled (checkpoint.backend or --no-memory), nothing to resume.")
+            return
+        snapshot = app.get_state(run_cfg)
+        if not snapshot.values:
+            print(f"No checkpoint found for run {run_id}")
+            return
+        if not snapshot.next:
+            print(f"Run {run_id} already finished.")
+            print(snapshot.values.get("response", "No response generated."))
+            return
+        print(f"Resuming run {run_id} at {', '.join(snapshot.next)} "
+              f"({len(snapshot.values.get('past_steps', []))} step results restored)")
+        # None as input continues from the checkpoint instead of starting over
+        initial_state = None
+    else:
+        task = args.task or "Calculate 10 + 5 and summarize."
+        run_id = new_run_id()
+        run_cfg = run_config(run_id)
+        print(f"Starting Agent with LangGraph Workflow for task: {task}")
+        if app.checkpointer is not None:
+            print(f"Run id: {run_id} (continue with --resume {run_id} if interrupted)")
+        
+        # Initialize State
+        initial_state = make_initial_state(task)
     
     # Run the graph
     # stream() yields events, invoke() runs to completion
     try:
-        final_state = app.invoke(initial_state)
+        with tracer.span("run", kind="run", run_id=run_id, resumed=bool(args.resume)):
+            if args.stream:
+                final_state = stream_graph(app, initial_state, run_cfg)
+            else:
+                final_state = app.invoke(initial_state, run_cfg)
         
         print("\n--- Final Result ---\n")
         print(final_state.get("response", "No response generated."))
         
+        from agent.utils.prompt_budget import format_prompt_stats
+        print("\n--- Prompt Tokens ---\n")
+        print(format_prompt_stats())
+        
+        from agent.llm.client import format_structured_stats
+        print("\n--- Structured Output ---\n")
+        print(format_structured_stats())
+        
         # Optional: Print history
         # print("\n--- Execution History ---")
         # for step in final_state.get("past_steps", []):
         #     print(f"Step: {step['step']} -> Result: {step['result']}")
             
+    except LLMUnavailableError as e:
+        # Operational, not a bug: no traceback, just how to pick the run up again
+        logger.error(f"LLM unavailable: {e}")
+        if app.checkpointer is not None:
+            print(f"Completed nodes are checkpointed; continue with --resume {run_id} once the LLM is reachable")
     except Exception as e:
         logger.error(f"Execution failed: {e}")
+        if app.checkpointer is not None:
+            print(f"Completed nodes are checkpointed; continue with --resume {run_id}")
         import traceback
         traceback.print_exc()
+    except KeyboardInterrupt:
+        if app.checkpointer is not None:
+            print(f"\nInterrupted; continue with --resume {run_id}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent CLI (LangGraph)")
+    parser.add_argument("--task", type=str, help="The task for the agent to perform")
+    parser.add_argument("--stream", action="store_true", help="Print plan/execute output incrementally as tokens arrive")
+    parser.add_argument("--no-memory", action="store_true", help="Run without long-term memory (skips loading chromadb and the embedding model)")
+    parser.add_argument("--resume", type=str, metavar="RUN_ID", help="Continue an interrupted run from its last checkpoint")
+    parser.add_argument("--profile", action="store_true", help="Trace the run and print per-node, LLM, tool and memory timings at the end")
+    
+    subparsers = parser.add_subparsers(dest="command")
+    batch_parser = subparsers.add_parser("batch", help="Run every task of a JSONL file against one shared graph")
+    batch_parser.add_argument("--input", type=str, default="requests.jsonl", help="JSONL file with one task per line")
+    batch_parser.add_argument("--output", type=str, default="results.jsonl", help="JSONL file results are appended to as tasks finish")
+    batch_parser.add_argument("--workers", type=int, default=4, help="Number of concurrent tasks")
+    batch_parser.add_argument("--executor", choices=["thread", "process"], default="thread", help="Worker pool type")
+    
+    args = parser.parse_args()
+    # Span export follows the tracing section of the config; --profile also keeps spans for the summary
+    tracer.configure(profile=args.profile)
+    
+    try:
+        if args.command == "batch":
+            run_batch(args)
+        else:
+            run_single(args)
+    finally:
+        if args.profile:
+            print("\n--- Profile ---\n")
+            print(tracer.format_summary())
+        tracer.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -2,6 +2,8 @@ from agent.tools.base import BaseTool
 from simpleeval import simple_eval
 
 class CalculatorTool(BaseTool):
+    cacheable = True
+
     def __init__(self):
         super().__init__("calculator", "A simple calculator that evaluates math expressions.")
 
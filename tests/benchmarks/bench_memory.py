@@ -0,0 +1,111 @@
+"""
+MemoryManager insert/query at scale.
+
+Long-term memory goes through the real MemoryManager (embedding service, vector
+store backend, batching). By default HashingEmbedder replaces the embedding model,
+so the numbers cover the memory layer rather than model inference and need no
+download; --embedder model uses the configured SentenceTransformer.
+
+For each backend and size:
+  - insert throughput of add_memories
+  - retrieve_relevant latency p50/p95 (distinct queries, so no embedding cache hits)
+  - short-term context store set/get latency
+
+Usage:
+    python tests/benchmarks/bench_memory.py [--sizes 1000,10000] [--backends numpy,chroma]
+        [--queries 100] [--embedder hash|model] [--json memory.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import REPO_ROOT, HashingEmbedder, sentences  # noqa: E402
+from agent.core.batch import percentile  # noqa: E402
+
+
+def bench(backend: str, size: int, n_queries: int, embedder: str):
+    from agent.memory.manager import MemoryManager
+    from agent.utils.config import config
+
+    config.set("memory.backend", backend)
+    config.set("memory.write_buffer.enabled", False)
+    path = tempfile.mkdtemp(prefix=f"bench_memory_{backend}_")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            memory = MemoryManager(persist_directory=path)
+        if embedder == "hash":
+            memory.embedder._model = HashingEmbedder()
+
+        documents = sentences(size, seed=1)
+        start = time.perf_counter()
+        memory.add_memories(documents)
+        insert = time.perf_counter() - start
+
+        latencies = []
+        for query in sentences(n_queries, seed=2, length=6):
+            start = time.perf_counter()
+            memory.retrieve_relevant(query, limit=5)
+            latencies.append(time.perf_counter() - start)
+
+        context_latencies = []
+        for i in range(1000):
+            start = time.perf_counter()
+            memory.store_context(f"key{i % 100}", {"value": i})
+            memory.retrieve_context(f"key{(i * 7) % 100}")
+            context_latencies.append(time.perf_counter() - start)
+
+        return {
+            "insert_s": insert,
+            "insert_per_s": size / insert,
+            "query_p50_ms": statistics.median(latencies) * 1000,
+            "query_p95_ms": percentile(latencies, 95) * 1000,
+            "context_set_get_p50_ms": statistics.median(context_latencies) * 1000
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory benchmark")
+    parser.add_argument("--sizes", type=str, default="1000,10000")
+    parser.add_argument("--backends", type=str, default="numpy,chroma")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--embedder", choices=["hash", "model"], default="hash")
+    parser.add_argument("--json", type=str, help="Write results to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.json) if args.json else None
+    os.chdir(REPO_ROOT)
+    if args.embedder == "hash":
+        # Chroma still instantiates the configured model when it validates the collection's
+        # embedding function; stay offline so that cannot stall on hub lookups
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    results = {"settings": {"embedder": args.embedder, "queries": args.queries}}
+    for size in [int(s) for s in args.sizes.split(",")]:
+        results[size] = {}
+        for backend in args.backends.split(","):
+            r = bench(backend, size, args.queries, args.embedder)
+            results[size][backend] = r
+            print(
+                f"{backend:<7}{size:>8}  insert {r['insert_s']:>7.2f}s ({r['insert_per_s']:>8.0f}/s)  "
+                f"query p50 {r['query_p50_ms']:>7.2f}ms  p95 {r['query_p95_ms']:>7.2f}ms  "
+                f"context {r['context_set_get_p50_ms']:.3f}ms"
+            )
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
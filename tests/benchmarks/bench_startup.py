@@ -0,0 +1,112 @@
+"""
+Startup time budget.
+
+Every measurement runs in a fresh interpreter from the repository root:
+  - import cost of the CLI and graph modules (python -X importtime), and whether
+    they pull in any of the heavy dependencies that should only load on first use
+  - wall time of `main.py --help`
+  - wall time of building the graph for a no-memory run
+
+Usage:
+    python tests/benchmarks/bench_startup.py [--runs 5] [--json startup.json]
+
+Exits with status 1 if any budget is exceeded.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Packages that must not be imported just by importing the CLI / graph module
+HEAVY_MODULES = ["chromadb", "sentence_transformers", "torch", "langchain_core", "langgraph", "openai"]
+
+# Seconds, median of --runs cold starts
+BUDGETS = {
+    "import_main": 0.3,
+    "help": 0.5,
+    "build_graph_no_memory": 3.0,
+}
+
+
+def run_python(args, env=None):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable] + args,
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        env=env
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{args} failed:\n{proc.stderr}")
+    return elapsed, proc
+
+
+def import_profile(module: str):
+    """Cumulative import time of module and the top-level packages it loaded"""
+    _, proc = run_python(["-X", "importtime", "-c", f"import {module}"])
+    total_us = 0
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not cumulative.isdigit():
+            continue  # header line
+        loaded.add(name.split(".")[0])
+        if name == module:
+            total_us = int(cumulative)
+    return total_us / 1e6, sorted(loaded & set(HEAVY_MODULES))
+
+
+def timed(args, runs):
+    return statistics.median(run_python(args)[0] for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", type=str, help="Write results to this file")
+    args = parser.parse_args()
+
+    results = {"budgets": BUDGETS, "heavy_imports": {}}
+
+    for module in ["main", "agent.core.graph"]:
+        seconds, heavy = import_profile(module)
+        results[f"import_{module}"] = seconds
+        results["heavy_imports"][module] = heavy
+
+    results["import_main"] = timed(["-c", "import main"], args.runs)
+    results["help"] = timed(["main.py", "--help"], args.runs)
+    results["build_graph_no_memory"] = timed(
+        ["-c", "from agent.core.graph import build_graph; build_graph(memory=False)"], args.runs
+    )
+
+    failures = []
+    for name, budget in BUDGETS.items():
+        status = "ok" if results[name] <= budget else "OVER"
+        if status == "OVER":
+            failures.append(name)
+        print(f"{name:<24}{results[name]:>8.3f}s  budget {budget:.2f}s  {status}")
+    for module, heavy in results["heavy_imports"].items():
+        print(f"import {module}: heavy modules loaded: {', '.join(heavy) or 'none'}")
+        if heavy:
+            failures.append(f"heavy imports in {module}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        print(f"FAILED: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
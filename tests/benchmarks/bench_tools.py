@@ -0,0 +1,154 @@
+"""
+Tool retrieval and skill loading.
+
+Retrieval: HybridToolRanker over a synthetic catalog, keyword-only (no memory) and
+hybrid (MemoryManager tool index with HashingEmbedder on the numpy backend). Reports
+indexing time, rank latency p50/p95 for uncached and repeated queries, and recall@5
+for queries paraphrasing a known tool's description.
+
+Skill loading: --skills generated modules loaded by SkillLoader cold (every module
+imported, manifest written) and warm (served from the manifest), plus the first
+call of a lazily loaded skill.
+
+Usage:
+    python tests/benchmarks/bench_tools.py [--tools 100,1000] [--skills 200]
+        [--queries 200] [--json tools.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import REPO_ROOT, HashingEmbedder, synthetic_tools, write_skills  # noqa: E402
+from agent.core.batch import percentile  # noqa: E402
+
+
+def rank_latencies(ranker, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        ranker.rank(query, 5)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_retrieval(n_tools: int, n_queries: int, hybrid: bool):
+    from agent.tools.ranker import HybridToolRanker
+    from agent.utils.config import config
+
+    tools = synthetic_tools(n_tools)
+    rng = random.Random(3)
+    targets = [rng.choice(tools) for _ in range(n_queries)]
+    # A query reuses part of the target's description, like a plan step naming what it needs
+    queries = [" ".join(t["description"].split()[:2] + rng.sample(t["description"].split()[2:], 4)) + f" #{i}"
+               for i, t in enumerate(targets)]
+
+    path = None
+    memory = None
+    if hybrid:
+        from agent.memory.manager import MemoryManager
+        config.set("memory.backend", "numpy")
+        path = tempfile.mkdtemp(prefix="bench_tools_")
+        with contextlib.redirect_stdout(io.StringIO()):
+            memory = MemoryManager(persist_directory=path)
+        memory.embedder._model = HashingEmbedder()
+
+    try:
+        ranker = HybridToolRanker(memory, cache_size=n_queries * 2)
+        start = time.perf_counter()
+        for tool in tools:
+            ranker.add_tool(tool["name"], tool["description"])
+        if memory:
+            memory.sync_tools([{"name": t["name"], "description": t["description"], "schema": None} for t in tools])
+        index = time.perf_counter() - start
+
+        cold = rank_latencies(ranker, queries)
+        warm = rank_latencies(ranker, queries)
+        hits = sum(1 for query, target in zip(queries, targets) if target["name"] in ranker.rank(query, 5))
+        return {
+            "index_s": index,
+            "rank_p50_ms": statistics.median(cold) * 1000,
+            "rank_p95_ms": percentile(cold, 95) * 1000,
+            "rank_cached_p50_ms": statistics.median(warm) * 1000,
+            "recall_at_5": hits / n_queries
+        }
+    finally:
+        if path:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def bench_skills(n_skills: int):
+    from agent.tools.skill_loader import SkillLoader
+
+    path = tempfile.mkdtemp(prefix="bench_skills_")
+    try:
+        write_skills(path, n_skills)
+        start = time.perf_counter()
+        tools = SkillLoader(path).load_skills()
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tools = SkillLoader(path).load_skills()
+        warm = time.perf_counter() - start
+
+        # Warm entries are lazy: the first call imports the module
+        start = time.perf_counter()
+        tools[0].run(text="hi")
+        first_call = time.perf_counter() - start
+
+        return {
+            "skills": len(tools),
+            "cold_load_s": cold,
+            "warm_load_s": warm,
+            "lazy_first_call_ms": first_call * 1000
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tool retrieval and skill loading benchmark")
+    parser.add_argument("--tools", type=str, default="100,1000")
+    parser.add_argument("--skills", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", type=str, help="Write results to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.json) if args.json else None
+    os.chdir(REPO_ROOT)
+
+    results = {"retrieval": {}}
+    for n_tools in [int(n) for n in args.tools.split(",")]:
+        results["retrieval"][n_tools] = {}
+        for mode in ["keyword", "hybrid"]:
+            r = bench_retrieval(n_tools, args.queries, hybrid=mode == "hybrid")
+            results["retrieval"][n_tools][mode] = r
+            print(
+                f"{mode:<8}{n_tools:>6} tools  index {r['index_s']:>6.2f}s  "
+                f"rank p50 {r['rank_p50_ms']:>6.2f}ms  p95 {r['rank_p95_ms']:>6.2f}ms  "
+                f"cached {r['rank_cached_p50_ms']:.3f}ms  recall@5 {r['recall_at_5']:.2f}"
+            )
+
+    r = bench_skills(args.skills)
+    results["skills"] = r
+    print(
+        f"skills {r['skills']:>5}  cold {r['cold_load_s']:.2f}s  warm {r['warm_load_s']:.3f}s  "
+        f"lazy first call {r['lazy_first_call_ms']:.1f}ms"
+    )
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
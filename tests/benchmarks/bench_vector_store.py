@@ -0,0 +1,122 @@
+"""
+Vector store backends: NumPy/HNSW vs Chroma.
+
+Random unit vectors stand in for embeddings, so no model is loaded. For each
+size the benchmark reports:
+  - insert time (batched adds)
+  - median query latency, with and without a metadata filter
+  - top-k overlap of each backend with an exact brute-force search
+At 1M entries each backend's first unfiltered query builds an HNSW graph over the
+whole store, which takes tens of minutes on a single core (random vectors are the
+worst case for HNSW).
+
+Usage:
+    python tests/benchmarks/bench_vector_store.py [--sizes 1000,100000,1000000]
+        [--dim 384] [--queries 50] [--k 10] [--backends numpy,chroma] [--json vectors.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from agent.memory.vector_store import NumpyVectorStore, ChromaVectorStore  # noqa: E402
+
+BATCH = 5000
+
+
+def random_unit(n: int, dim: int, rng) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def open_store(backend: str, path: str):
+    if backend == "numpy":
+        return NumpyVectorStore(path)
+    import chromadb
+    client = chromadb.PersistentClient(path=path)
+    return ChromaVectorStore(client.get_or_create_collection(name="bench_vectors", metadata={"hnsw:space": "cosine"}))
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, mask=None):
+    sims = vectors @ query
+    if mask is not None:
+        sims = np.where(mask, sims, -np.inf)
+    top = np.argpartition(-sims, k)[:k]
+    return {str(i) for i in top}
+
+
+def bench(backend: str, vectors: np.ndarray, queries: np.ndarray, groups: np.ndarray, k: int):
+    path = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        store = open_store(backend, path)
+        start = time.perf_counter()
+        for i in range(0, len(vectors), BATCH):
+            ids = [str(j) for j in range(i, min(i + BATCH, len(vectors)))]
+            store.add(
+                ids=ids,
+                documents=[f"doc {j}" for j in ids],
+                metadatas=[{"group": int(groups[int(j)])} for j in ids],
+                embeddings=vectors[i:i + BATCH].tolist()
+            )
+        insert = time.perf_counter() - start
+
+        result = {"insert_s": insert}
+        for label, where in [("query", None), ("query_filtered", {"group": 0})]:
+            mask = groups == 0 if where else None
+            latencies, overlaps = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits = store.query(query_embeddings=[query.tolist()], n_results=k, where=where, include=["distances"])
+                latencies.append(time.perf_counter() - start)
+                expected = exact_top_k(vectors, query, k, mask)
+                overlaps.append(len(expected & set(hits["ids"][0])) / k)
+            result[f"{label}_p50_ms"] = statistics.median(latencies) * 1000
+            result[f"{label}_recall"] = statistics.mean(overlaps)
+        return result
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store benchmark")
+    parser.add_argument("--sizes", type=str, default="1000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", type=str, default="numpy,chroma")
+    parser.add_argument("--json", type=str, help="Write results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in [int(s) for s in args.sizes.split(",")]:
+        vectors = random_unit(size, args.dim, rng)
+        queries = random_unit(args.queries, args.dim, rng)
+        # Ten groups, so the filtered query keeps ~10% of the store
+        groups = rng.integers(0, 10, size)
+        results[size] = {}
+        for backend in args.backends.split(","):
+            r = bench(backend, vectors, queries, groups, args.k)
+            results[size][backend] = r
+            print(
+                f"{backend:<7}{size:>9}  insert {r['insert_s']:>8.2f}s  "
+                f"query p50 {r['query_p50_ms']:>7.2f}ms (recall {r['query_recall']:.2f})  "
+                f"filtered p50 {r['query_filtered_p50_ms']:>7.2f}ms (recall {r['query_filtered_recall']:.2f})"
+            )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
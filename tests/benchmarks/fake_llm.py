@@ -0,0 +1,205 @@
+"""
+Deterministic OpenAI-compatible server for benchmarks (and for running the
+manual checks without a model).
+
+Responses are scripted per node, recognised by the system prompt each node sends:
+  plan       -> plan_steps steps "Calculate i + i [after: none]" plus a final
+                "Summarize the results" step that depends on all of them
+  execute    -> a calculator call for "Calculate a + b" steps, otherwise a direct response
+  reflect    -> {"action": "next"}
+  summarize  -> a fixed one-line summary
+A --script JSON file of [{"match": "substring", "response": "..."}] rules is checked
+first, against the system prompt and the last user message.
+
+Structured output: with --malformed-every N, every Nth JSON answer comes back the
+way chatty models write it (fenced, single-quoted, trailing comma) unless the request
+carried a response_format, which the server then honours like constrained decoding.
+--no-response-format makes it reject response_format with a 400 instead.
+
+Timing model: every completion waits `latency` seconds (time to first token), then
+streams/returns its tokens at `tokens_per_sec` (one token = 4 characters).
+
+Usage:
+    python tests/benchmarks/fake_llm.py [--port 1234] [--latency 0.05]
+        [--tokens-per-sec 200] [--plan-steps 3] [--script rules.json]
+        [--malformed-every N] [--no-response-format]
+
+or in-process:
+    server = FakeLLMServer(latency=0.05).start()   # server.url -> http://127.0.0.1:<port>/v1
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+CALCULATION = re.compile(r'Calculate\s+(\d+)\s*\+\s*(\d+)', re.IGNORECASE)
+
+
+def count_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+class FakeLLMServer:
+    def __init__(self, port: int = 0, latency: float = 0.05, tokens_per_sec: float = 200.0,
+                 plan_steps: int = 3, rules: Optional[List[Dict[str, str]]] = None,
+                 malformed_every: int = 0, response_format: bool = True):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.plan_steps = plan_steps
+        self.rules = rules or []
+        self.malformed_every = malformed_every
+        self.response_format = response_format
+        self.stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "json_answers": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def respond(self, messages: List[Dict[str, Any]]) -> str:
+        system = " ".join(m["content"] for m in messages if m["role"] == "system")
+        user = messages[-1]["content"] if messages else ""
+
+        for rule in self.rules:
+            if rule["match"] in system or rule["match"] in user:
+                return rule["response"]
+
+        if "plans tasks" in system:
+            steps = [f"{i}. Calculate {i} + {i} [after: none]" for i in range(1, self.plan_steps + 1)]
+            deps = ", ".join(str(i) for i in range(1, self.plan_steps + 1))
+            steps.append(f"{self.plan_steps + 1}. Summarize the results [after: {deps}]")
+            return "\n".join(steps)
+        if "supervisor" in system:
+            return json.dumps({"action": "next", "reason": "step completed", "new_plan": []})
+        if "executes tasks" in system:
+            match = CALCULATION.search(user.split("Full Input:")[0])
+            if match:
+                return json.dumps({"tool": "calculator", "args": {"expression": f"{match.group(1)}+{match.group(2)}"}})
+            return json.dumps({"tool": None, "response": "All results collected."})
+        return "Summary: the previous steps computed their sums with the calculator."
+
+    def malform(self, text: str) -> str:
+        """Every malformed_every-th JSON answer, written the way unconstrained models slip"""
+        with self._stats_lock:
+            self.stats["json_answers"] += 1
+            count = self.stats["json_answers"]
+        if not self.malformed_every or count % self.malformed_every or not text.startswith("{"):
+            return text
+        broken = text.replace('"', "'").replace("}", ",}", 1)
+        return f"Here is the decision:\n```json\n{broken}\n```"
+
+    def _record(self, prompt_tokens: int, completion_tokens: int):
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, body: Dict[str, Any], status: int = 200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._send_json({"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                messages = body.get("messages", [])
+                if body.get("response_format"):
+                    if not server.response_format:
+                        with server._stats_lock:
+                            server.stats["rejected"] += 1
+                        return self._send_json({"error": {"message": "response_format is not supported",
+                                                          "type": "invalid_request_error"}}, status=400)
+                    text = server.respond(messages)
+                else:
+                    text = server.malform(server.respond(messages))
+                prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+                completion_tokens = count_tokens(text)
+                server._record(prompt_tokens, completion_tokens)
+
+                time.sleep(server.latency)
+                if body.get("stream"):
+                    return self._stream(text, body.get("model", "fake-model"))
+
+                time.sleep(completion_tokens / server.tokens_per_sec)
+                self._send_json({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "fake-model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens}
+                })
+
+            def _stream(self, text: str, model: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i in range(0, len(text), 4):
+                    chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": text[i:i + 4]}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(1 / server.tokens_per_sec)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake OpenAI-compatible server")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--plan-steps", type=int, default=3)
+    parser.add_argument("--script", type=str, help="JSON file of {match, response} rules")
+    parser.add_argument("--malformed-every", type=int, default=0, help="Malform every Nth JSON answer sent without response_format")
+    parser.add_argument("--no-response-format", action="store_true", help="Reject requests that set response_format")
+    args = parser.parse_args()
+
+    rules = None
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+    server = FakeLLMServer(args.port, args.latency, args.tokens_per_sec, args.plan_steps, rules,
+                           malformed_every=args.malformed_every, response_format=not args.no_response_format)
+    print(f"Fake LLM on {server.url} (latency {args.latency}s, {args.tokens_per_sec} tokens/s)", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Shared benchmark fixtures: a deterministic embedder, a synthetic tool catalog,
+generated skill modules and config overrides pointing the agent at FakeLLMServer.
+"""
+import hashlib
+import os
+import random
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+WORDS = (
+    "file read write search web fetch url parse json csv sql query database table image resize "
+    "convert pdf text summarize translate email send calendar event weather forecast stock price "
+    "git commit diff branch issue ticket deploy build test lint format compress archive upload "
+    "download user account permission log metric alert cache queue schedule notify math plot"
+).split()
+
+
+class HashingEmbedder:
+    """
+    Stand-in for the SentenceTransformer model: hashed bag of words, L2-normalised.
+    Same interface as the model's encode(), so it can be set as EmbeddingService._model.
+    Texts sharing words get similar vectors, so retrieval results stay meaningful.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = hashlib.md5(word.encode()).digest()
+                matrix[row, int.from_bytes(digest[:4], "little") % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return matrix[0] if single else matrix
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+def sentences(n: int, seed: int = 0, length: int = 12) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(length)) for _ in range(n)]
+
+
+def synthetic_tools(n: int, seed: int = 0) -> List[Dict[str, str]]:
+    """n tools with distinct names and word-salad descriptions over a shared vocabulary"""
+    rng = random.Random(seed)
+    tools = []
+    for i in range(n):
+        verb, noun = rng.choice(WORDS), rng.choice(WORDS)
+        tools.append({
+            "name": f"{verb}_{noun}_{i}",
+            "description": f"{verb.capitalize()} {noun}. " + " ".join(rng.choice(WORDS) for _ in range(15))
+        })
+    return tools
+
+
+SKILL_TEMPLATE = '''from agent.tools.base import BaseTool
+
+
+class {cls}(BaseTool):
+    def __init__(self):
+        super().__init__("{name}", "{description}")
+
+    def run(self, text: str = "", **kwargs):
+        return text
+
+
+def get_tools():
+    return [{cls}()]
+'''
+
+
+def write_skills(directory: str, n: int, seed: int = 0) -> List[str]:
+    """Write n single-tool skill modules into directory, returning their tool names"""
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for i, tool in enumerate(synthetic_tools(n, seed)):
+        with open(os.path.join(directory, f"skill_{i:04d}.py"), 'w', encoding='utf-8') as f:
+            f.write(SKILL_TEMPLATE.format(cls=f"Skill{i}", name=tool["name"], description=tool["description"]))
+        names.append(tool["name"])
+    return names
+
+
+def use_fake_llm(url: str):
+    """Point the agent at a FakeLLMServer, with caching and checkpointing off so every run does real work"""
+    from agent.utils.config import config
+    config.set("llm.api_base", url)
+    config.set("llm.cache.enabled", False)
+    config.set("checkpoint.backend", "none")
+    config.set("mcp.servers", {})
+    config.set("tracing.enabled", False)
@@ -0,0 +1,144 @@
+"""
+Runs the benchmark suite and writes one machine-readable result file.
+
+Each benchmark runs in its own interpreter with --json; the results are merged
+under the benchmark's name together with the commit, Python version and host.
+With --compare, every metric is checked against a previous result file:
+names ending in _s/_ms are times (lower is better), _per_s and recall rates
+are higher-is-better; a change worse than --threshold is a regression and the
+runner exits with status 1.
+
+Usage:
+    python tests/benchmarks/run_all.py [--only graph,memory] [--quick]
+        [--output bench_results.json] [--compare baseline.json] [--threshold 0.15]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(BENCH_DIR))
+
+# name -> (script, full args, --quick args)
+BENCHMARKS = {
+    "startup": ("bench_startup.py", ["--runs", "5"], ["--runs", "2"]),
+    "graph": ("bench_graph.py", [], ["--tasks", "6", "--workers", "2"]),
+    "memory": ("bench_memory.py", [], ["--sizes", "1000", "--queries", "30"]),
+    "tools": ("bench_tools.py", [], ["--tools", "100", "--skills", "30", "--queries", "50"]),
+    # 1M entries (the script's default) spends tens of minutes per backend building the
+    # HNSW graph on a single core, too slow for a regression run; run it directly
+    "vector_store": ("bench_vector_store.py", ["--sizes", "1000,100000"], ["--sizes", "1000", "--queries", "20"]),
+}
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if not compared"""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_s") or leaf.startswith("recall") or leaf.endswith("_recall"):
+        return 1
+    if leaf.endswith("_s") or leaf.endswith("_ms"):
+        return -1
+    return 0
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float):
+    """[(metric, baseline, current, relative change)] for metrics that got worse by more than threshold"""
+    now, before = flatten(current["benchmarks"]), flatten(baseline["benchmarks"])
+    regressions = []
+    for metric, old in before.items():
+        sign = direction(metric)
+        new = now.get(metric)
+        if not sign or new is None or old == 0:
+            continue
+        change = (new - old) / abs(old)
+        if -sign * change > threshold:
+            regressions.append((metric, old, new, change))
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--only", type=str, help=f"Comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="Small sizes, for a fast smoke run")
+    parser.add_argument("--output", type=str, default="bench_results.json")
+    parser.add_argument("--compare", type=str, help="Baseline result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "benchmarks": {},
+        "failed": []
+    }
+
+    for name in names:
+        script, full_args, quick_args = BENCHMARKS[name]
+        print(f"\n=== {name} ===", flush=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            result_path = os.path.join(tmp, f"{name}.json")
+            proc = subprocess.run(
+                [sys.executable, os.path.join(BENCH_DIR, script)] + (quick_args if args.quick else full_args) + ["--json", result_path],
+                cwd=REPO_ROOT
+            )
+            # bench_startup exits 1 when over budget but still writes its results
+            if os.path.exists(result_path):
+                with open(result_path, 'r', encoding='utf-8') as f:
+                    report["benchmarks"][name] = json.load(f)
+            if proc.returncode != 0:
+                report["failed"].append(name)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    status = 1 if report["failed"] else 0
+    if report["failed"]:
+        print(f"Failed: {', '.join(report['failed'])}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} ({baseline.get('commit') or 'unknown commit'}), threshold {args.threshold:.0%}:")
+        for metric, old, new, change in regressions:
+            print(f"  REGRESSION {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+        if regressions:
+            status = 1
+        else:
+            print("  no regressions")
+
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import sys
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.getcwd())
+
+from agent.tools.mcp_adapter import MCPAdapter
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_stub_server.py")
+PORT = 8765
+
+
+def check_server(name, spec):
+    print(f"\n--- {name} ---")
+    adapter = MCPAdapter()
+    adapter.connect_server("stub", spec)
+    changed = []
+    adapter.on_tools_changed = changed.append
+
+    start = time.perf_counter()
+    tools = {t.name: t for t in adapter.list_tools()}
+    print(f"Discovered {len(tools)} tools in {time.perf_counter() - start:.2f}s: {sorted(tools)}")
+
+    print(f"echo -> {tools['echo'].run(text='hello')}")
+    print(f"add  -> {tools['add'].run(a=2, b=3)}")
+    print(f"fail -> {tools['fail'].run()}")
+
+    # Eight 0.5s calls over the one session should take ~0.5s, not 4s
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: tools["sleep"].run(seconds=0.5), range(8)))
+    print(f"8 pipelined sleep(0.5) calls: {time.perf_counter() - start:.2f}s ({results.count('slept')} ok)")
+
+    # Cached: no round trip
+    start = time.perf_counter()
+    adapter.clients["stub"].list_tools()
+    print(f"cached tools/list: {(time.perf_counter() - start) * 1000:.2f}ms")
+
+    tools["add_tool"].run(name=f"dyn_{name.split()[0].lower()}")
+    for _ in range(50):
+        if changed:
+            break
+        time.sleep(0.1)
+    refreshed = [t.name for t in adapter.list_server_tools("stub")]
+    print(f"list_changed received: {bool(changed)}; tools now: {sorted(refreshed)}")
+    adapter.close()
+
+
+def check_mcp():
+    check_server("stdio", {"command": [sys.executable, STUB, "--stdio"]})
+
+    server = subprocess.Popen([sys.executable, STUB, "--http", str(PORT)])
+    try:
+        time.sleep(1)
+        check_server("Streamable HTTP", f"http://127.0.0.1:{PORT}/mcp")
+        check_server("HTTP+SSE", f"http://127.0.0.1:{PORT}/sse")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    check_mcp()
@@ -0,0 +1,80 @@
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(os.getcwd())
+
+from agent.memory.storage import LogStorage, create_storage
+from agent.memory.retriever import Retriever
+
+def check_storage():
+    directory = tempfile.mkdtemp(prefix="log_storage_")
+    try:
+        print("\n--- Append + Search ---")
+        # Tiny segments so the writes below span several of them
+        storage = LogStorage(directory, segment_size=512)
+        for i in range(20):
+            storage.add({"id": f"m{i}", "content": f"note {i} about {'python' if i % 2 else 'redis'}"})
+        storage.add({"content": "an item without an id mentions python too"})
+        print(f"Items: {len(storage)}, segments: {len(storage._segments())}")
+        assert len(storage) == 21
+        assert len(storage._segments()) > 1
+
+        hits = storage.search("redis", limit=20)
+        print(f"'redis' hits: {len(hits)}")
+        assert len(hits) == 10
+        assert all("redis" in item["content"] for item, _ in hits)
+
+        print("\n--- Overwrite + Delete ---")
+        storage.add({"id": "m0", "content": "rewritten to talk about kafka"})
+        storage.delete("m2")
+        assert storage.get("m0")["content"] == "rewritten to talk about kafka"
+        assert storage.get("m2") is None
+        assert len(storage.search("redis", limit=20)) == 8
+        assert [item["id"] for item, _ in storage.search("kafka")] == ["m0"]
+        print("Overwrite replaces and delete removes from the index")
+
+        print("\n--- Compaction ---")
+        before = sum(os.path.getsize(storage._segment_path(s)) for s in storage._segments())
+        storage.compact()
+        after = sum(os.path.getsize(storage._segment_path(s)) for s in storage._segments())
+        print(f"Bytes on disk: {before} -> {after}")
+        assert after < before
+        assert len(storage) == 20
+        assert storage.get("m0")["content"] == "rewritten to talk about kafka"
+        assert len(storage.search("python", limit=20)) == 11
+        storage.close()
+
+        print("\n--- Reopen + CRC ---")
+        # Simulate a crash mid-append: a torn record at the end of the active segment
+        last = storage._segment_path(storage._segments()[-1])
+        with open(last, 'ab') as f:
+            f.write(LogStorage.HEADER.pack(100, 0xDEADBEEF, LogStorage.PUT, 2) + b"m9{\"trunc")
+        size = os.path.getsize(last)
+
+        storage = LogStorage(directory, segment_size=512)
+        print(f"Items after reopen: {len(storage)}, active segment {size} -> {os.path.getsize(last)} bytes")
+        assert len(storage) == 20
+        assert os.path.getsize(last) < size
+        assert storage.get("m9")["content"] == "note 9 about python"
+        assert storage.get("m2") is None
+        assert [item["id"] for item, _ in storage.search("kafka")] == ["m0"]
+
+        print("\n--- Retriever ---")
+        retrieved = Retriever(storage).retrieve("python note 9", limit=3)
+        print(f"Top hit: {retrieved[0]['content']}")
+        assert retrieved[0]["id"] == "m9"
+        storage.close()
+
+        print("\n--- Factory ---")
+        assert isinstance(create_storage("log", os.path.join(directory, "factory")), LogStorage)
+        assert create_storage("memory").search("anything") == []
+        print("create_storage builds both backends")
+
+        print("\n--- Verification Passed ---")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    check_storage()
@@ -0,0 +1,219 @@
+"""
+Minimal MCP server for exercising agent/tools/mcp_adapter.py without a real one.
+
+Tools:
+  echo(text)          - returns text
+  add(a, b)           - returns a + b
+  sleep(seconds)      - sleeps, then returns; requests are handled concurrently
+  add_tool(name)      - registers another echo-like tool and sends tools/list_changed
+  fail()              - returns an isError result
+
+Usage:
+    python tests/manual_checks/mcp_stub_server.py --stdio
+    python tests/manual_checks/mcp_stub_server.py --http 8765   # Streamable HTTP on /mcp, HTTP+SSE on /sse
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+TOOLS = {
+    "echo": {"description": "Echo the given text back", "properties": {"text": {"type": "string"}}},
+    "add": {"description": "Add two numbers", "properties": {"a": {"type": "number"}, "b": {"type": "number"}}},
+    "sleep": {"description": "Sleep for the given number of seconds", "properties": {"seconds": {"type": "number"}}},
+    "add_tool": {"description": "Register a new tool at runtime", "properties": {"name": {"type": "string"}}},
+    "fail": {"description": "Always fails", "properties": {}},
+}
+tools_lock = threading.Lock()
+# Callables that push a server notification to every connected client
+notifiers = []
+
+
+def tool_specs():
+    with tools_lock:
+        return [
+            {"name": name, "description": t["description"],
+             "inputSchema": {"type": "object", "properties": t["properties"]}}
+            for name, t in TOOLS.items()
+        ]
+
+
+def call_tool(name, args):
+    if name == "echo" or name.startswith("dyn_"):
+        return {"content": [{"type": "text", "text": str(args.get("text", ""))}]}
+    if name == "add":
+        return {"content": [{"type": "text", "text": str(args["a"] + args["b"])}]}
+    if name == "sleep":
+        time.sleep(float(args.get("seconds", 1)))
+        return {"content": [{"type": "text", "text": "slept"}]}
+    if name == "add_tool":
+        with tools_lock:
+            TOOLS[args["name"]] = {"description": "Runtime tool", "properties": {"text": {"type": "string"}}}
+        for notify in list(notifiers):
+            notify({"jsonrpc": "2.0", "method": "notifications/tools/list_changed"})
+        return {"content": [{"type": "text", "text": f"added {args['name']}"}]}
+    if name == "fail":
+        return {"content": [{"type": "text", "text": "it failed"}], "isError": True}
+    raise KeyError(name)
+
+
+def handle(message):
+    """Response dict for a request, None for notifications"""
+    if "id" not in message:
+        return None
+    method = message.get("method")
+    params = message.get("params") or {}
+    try:
+        if method == "initialize":
+            result = {
+                "protocolVersion": params.get("protocolVersion", "2025-03-26"),
+                "capabilities": {"tools": {"listChanged": True}},
+                "serverInfo": {"name": "stub", "version": "0.1"}
+            }
+        elif method == "ping":
+            result = {}
+        elif method == "tools/list":
+            result = {"tools": tool_specs()}
+        elif method == "tools/call":
+            with tools_lock:
+                known = params["name"] in TOOLS
+            if not known:
+                return {"jsonrpc": "2.0", "id": message["id"],
+                        "error": {"code": -32602, "message": f"Unknown tool: {params['name']}"}}
+            result = call_tool(params["name"], params.get("arguments") or {})
+        else:
+            return {"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32601, "message": "Method not found"}}
+    except Exception as e:
+        return {"jsonrpc": "2.0", "id": message["id"], "error": {"code": -32603, "message": str(e)}}
+    return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+
+
+def serve_stdio():
+    write_lock = threading.Lock()
+
+    def write(message):
+        with write_lock:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    notifiers.append(write)
+
+    def worker(message):
+        response = handle(message)
+        if response:
+            write(response)
+
+    for line in sys.stdin:
+        if line.strip():
+            # Every request on its own thread, so pipelined calls overlap
+            threading.Thread(target=worker, args=(json.loads(line),), daemon=True).start()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # SSE session id -> queue of messages for its GET stream
+    sse_sessions = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _open_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+    def _event(self, data, event="message"):
+        self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode())
+        self.wfile.flush()
+
+    def _pump(self, q):
+        while True:
+            message = q.get()
+            if message is None:
+                return
+            self._event(json.dumps(message))
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        q = queue.Queue()
+        notifiers.append(q.put)
+        try:
+            self._open_stream()
+            if path == "/sse":
+                session = uuid.uuid4().hex
+                self.sse_sessions[session] = q
+                self._event(f"/messages?session_id={session}", event="endpoint")
+            self._pump(q)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            notifiers.remove(q.put)
+
+    def do_DELETE(self):
+        self._send_json(200)
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        message = json.loads(self.rfile.read(length))
+
+        if parsed.path == "/messages":
+            q = self.sse_sessions.get(parse_qs(parsed.query).get("session_id", [""])[0])
+            if q is None:
+                return self._send_json(404, {"error": "unknown session"})
+            self._send_json(202)
+
+            def respond():
+                response = handle(message)
+                if response:
+                    q.put(response)
+            threading.Thread(target=respond, daemon=True).start()
+            return
+
+        response = handle(message)
+        headers = {"Mcp-Session-Id": "stub-session"} if message.get("method") == "initialize" else None
+        if response is None:
+            return self._send_json(202)
+        if message.get("method") == "tools/call":
+            # Tool results come back as an SSE stream, like servers that stream progress
+            self._open_stream()
+            self._event(json.dumps(response))
+            self.close_connection = True
+            return
+        self._send_json(200, response, headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub MCP server")
+    parser.add_argument("--stdio", action="store_true")
+    parser.add_argument("--http", type=int, metavar="PORT")
+    args = parser.parse_args()
+
+    if args.http:
+        server = ThreadingHTTPServer(("127.0.0.1", args.http), Handler)
+        server.daemon_threads = True
+        print(f"Stub MCP server on http://127.0.0.1:{args.http}/mcp and /sse", file=sys.stderr, flush=True)
+        server.serve_forever()
+    else:
+        serve_stdio()
+
+
+if __name__ == "__main__":
+    main()